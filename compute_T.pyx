@@ -1,25 +1,44 @@
 # cython: boundscheck=False, wraparound=False, nonecheck=False
 import numpy as np
 cimport numpy as np
+from cython.parallel cimport prange
+from libc.stdint cimport int64_t, uint8_t, uint64_t
 
-def build_matrix_by_lookup_c(
-    int n,
-    list row_map,
-    list col_map,
-    np.ndarray[np.uint8_t, ndim=2] matrix
-) -> np.ndarray:
-    cdef int i, j
-    cdef int row1, row2, col1, col2
-
-    # Allocate result array
-    cdef np.ndarray[np.uint8_t, ndim=2] result = np.zeros((n, n), dtype=np.bool_)
 
-    for i in range(n):
-        for j in range(n):
-            row1 = row_map[i]
-            row2 = row_map[j]
-            col1 = col_map[i]
-            col2 = col_map[j]
-            result[i, j] = matrix[row1, col2] & matrix[row2, col1]
+def build_adjacency_bits_c(
+    const int64_t[:] row_map,
+    const int64_t[:] col_map,
+    const uint8_t[:, :] matrix,
+    int num_threads=1
+) -> np.ndarray:
+    """
+    result[i, j] = matrix[row_map[i], col_map[j]] & matrix[row_map[j], col_map[i]], symmetric.
+    Row i is packed into uint64 words, bit j in word j // 64 at position j % 64 (little endian, as bitmatrix.pack).
+    Only the upper triangle is evaluated, then mirrored. Both passes write one row per thread,
+    so they run in parallel when the extension is compiled with OpenMP.
+    :param num_threads: threads of each pass, ignored without OpenMP
+    """
+    cdef Py_ssize_t n = row_map.shape[0]
+    cdef Py_ssize_t words = (n + 63) // 64
+    result_array = np.zeros((n, max(words, 1)), dtype=np.uint64)
+    cdef uint64_t[:, :] result = result_array
+    cdef Py_ssize_t i, j
+    cdef int64_t row1, col1
 
-    return result
\ No newline at end of file
+    if n == 0:
+        return result_array
+    if num_threads < 1:
+        num_threads = 1
+    # upper triangle, row i only written by its own iteration
+    for i in prange(n, nogil=True, schedule='dynamic', num_threads=num_threads):
+        row1 = row_map[i]
+        col1 = col_map[i]
+        for j in range(i, n):
+            if matrix[row1, col_map[j]] & matrix[row_map[j], col1]:
+                result[i, j >> 6] |= (<uint64_t> 1) << (j & 63)
+    # mirror, row j reads rows i < j finished by the first pass
+    for j in prange(n, nogil=True, schedule='dynamic', num_threads=num_threads):
+        for i in range(j):
+            if (result[i, j >> 6] >> (j & 63)) & 1:
+                result[j, i >> 6] |= (<uint64_t> 1) << (i & 63)
+    return result_array
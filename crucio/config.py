@@ -15,6 +15,21 @@ class Config:
     examples = []
     reverse = False
     raw_cache = False
+    oracleWorkers = 0  # >1 parses batches in parallel, see ParallelExtendOracle
+    oracleWorkerMode = 'thread'  # 'thread' for external oracles, 'process' for oracles running in python
+    lazyDM = False  # query distributional matrix cells only when infer_dm reads them
+    oracleCacheNegatives = None  # negatives kept per oracle cache tier, None keeps all, see CacheTier
+    incrementalAdjacency = True  # carry the interchange adjacency across infer_dm iterations, see update_adjacency
+    adjacencyThreads = 0  # threads of the OpenMP adjacency kernel, 0 uses every cpu
+    cliqueTimeLimit = None  # seconds spent generating cliques per infer_dm iteration, None is unbounded
+    cliqueLimit = None  # cliques tried per infer_dm iteration, None is unbounded
+    cliqueWorkers = 0  # >1 enumerates the cliques of new graph components in a process pool
+    coverageWorkers = 0  # >1 validates clique coverages in a process pool, needs nativeRecognizer, see validate_in_pool
+    coverageBatch = 64  # sentences per batch sent to a coverage worker or to the batch recognizer
+    batchRecognizer = False  # check coverages in batches with the bit-parallel CYKRecognizer, pays off on large coverages
+    batchRecall = False  # recall by one CYKRecognizer pass instead of a Lark parse per sentence, cubic in length, no timeout
+    nativeRecognizer = True  # infer_dm checks coverages with EarleyRecognizer instead of rebuilding a Lark parser
+    graphRecordDir = None  # save every interchange graph here, for the clique benchmark in clique.py
 
 
 def printParallel(*args, **kwargs):
@@ -0,0 +1,261 @@
+"""
+按位压缩的0/1矩阵, 每个uint64存64个单元
+"""
+from typing import Collection, Optional
+
+import numpy as np
+
+WORD = np.dtype('<u8')
+BITS = 64
+# numpy 1.24 没有 bitwise_count, 按字节查表
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> int:
+    """
+    :param words: uint64 数组
+    :return: 所有置位的个数
+    """
+    return int(POPCOUNT[np.ascontiguousarray(words, dtype=WORD).view(np.uint8)].sum(dtype=np.int64))
+
+
+def pack(bits: np.ndarray, n_words: int) -> np.ndarray:
+    """
+    把0/1向量打包成 n_words 个 uint64, 第j位在第j//64个字的第j%64位
+    """
+    packed = np.packbits(np.asarray(bits, dtype=np.uint8), bitorder='little')
+    buffer = np.zeros(n_words * 8, dtype=np.uint8)
+    buffer[:len(packed)] = packed
+    return buffer.view(WORD)
+
+
+def pack_rows(bits: np.ndarray, n_words: int) -> np.ndarray:
+    """
+    二维0/1矩阵的每行打包成 n_words 个 uint64
+    """
+    packed = np.packbits(np.asarray(bits, dtype=np.uint8), axis=1, bitorder='little')
+    buffer = np.zeros((packed.shape[0], n_words * 8), dtype=np.uint8)
+    buffer[:, :packed.shape[1]] = packed
+    return buffer.view(WORD)
+
+
+def unpack(words: np.ndarray, n: int) -> np.ndarray:
+    """
+    pack的逆操作, 支持二维(每行一个向量)
+    """
+    words = np.ascontiguousarray(words, dtype=WORD)
+    bits = np.unpackbits(words.view(np.uint8), axis=-1, bitorder='little')
+    return bits[..., :n]
+
+
+class RowView:
+    """
+    矩阵的一行, 矩阵扩容后仍然有效
+    """
+
+    def __init__(self, mat: "BitMatrix", index: int):
+        self.mat = mat
+        self.index = index
+
+    def words(self) -> np.ndarray:
+        return self.mat.words[self.index, :self.mat.n_words]
+
+    def count(self) -> int:
+        return popcount(self.words())
+
+    def toarray(self) -> np.ndarray:
+        return unpack(self.words(), self.mat.shape[1])
+
+    def __getitem__(self, j: int) -> int:
+        return self.mat[self.index, j]
+
+    def __len__(self):
+        return self.mat.shape[1]
+
+
+class ColumnView:
+    """
+    矩阵的一列, 矩阵扩容后仍然有效
+    """
+
+    def __init__(self, mat: "BitMatrix", index: int):
+        self.mat = mat
+        self.index = index
+
+    def toarray(self) -> np.ndarray:
+        w, b = divmod(self.index, BITS)
+        rows = self.mat.shape[0]
+        return ((self.mat.words[:rows, w] >> np.uint64(b)) & np.uint64(1)).astype(np.uint8)
+
+    def count(self) -> int:
+        return int(self.toarray().sum(dtype=np.int64))
+
+    def __getitem__(self, i: int) -> int:
+        return self.mat[i, self.index]
+
+    def __len__(self):
+        return self.mat.shape[0]
+
+
+class BitMatrix:
+    def __init__(self, rows: int = 0, cols: int = 0):
+        """
+        行列容量均按倍增扩展, 增加行列的均摊代价与新增单元数成正比
+        """
+        self.__rows = rows
+        self.__cols = cols
+        self.words = np.zeros((max(rows, 1), max(self.__words_for(cols), 1)), dtype=WORD)
+
+    @staticmethod
+    def __words_for(cols: int) -> int:
+        return (cols + BITS - 1) // BITS
+
+    @staticmethod
+    def fromarray(array: np.ndarray) -> "BitMatrix":
+        rows, cols = array.shape
+        mat = BitMatrix(rows, cols)
+        if rows > 0 and cols > 0:
+            mat.words[:rows] = pack_rows(array, mat.words.shape[1])
+        return mat
+
+    def copy(self) -> "BitMatrix":
+        mat = BitMatrix(self.__rows, self.__cols)
+        mat.words[:self.__rows, :self.n_words] = self.words[:self.__rows, :self.n_words]
+        return mat
+
+    @property
+    def shape(self):
+        return self.__rows, self.__cols
+
+    @property
+    def n_words(self) -> int:
+        return self.__words_for(self.__cols)
+
+    def __reserve(self, rows: int, cols: int):
+        capacity_rows, capacity_words = self.words.shape
+        words = self.__words_for(cols)
+        if rows <= capacity_rows and words <= capacity_words:
+            return
+        while capacity_rows < rows:
+            capacity_rows *= 2
+        while capacity_words < words:
+            capacity_words *= 2
+        grown = np.zeros((capacity_rows, capacity_words), dtype=WORD)
+        grown[:self.__rows, :self.n_words] = self.words[:self.__rows, :self.n_words]
+        self.words = grown
+
+    def addRow(self, bits: Optional[np.ndarray] = None) -> int:
+        """
+        :param bits: 长度为列数的0/1向量, None为全0
+        :return: 新行的下标
+        """
+        self.__reserve(self.__rows + 1, self.__cols)
+        index = self.__rows
+        self.__rows += 1
+        if bits is not None:
+            self.words[index, :self.n_words] = pack(bits, self.n_words)
+        return index
+
+    def addColumn(self, bits: Optional[np.ndarray] = None) -> int:
+        """
+        :param bits: 长度为行数的0/1向量, None为全0
+        :return: 新列的下标
+        """
+        self.__reserve(self.__rows, self.__cols + 1)
+        index = self.__cols
+        self.__cols += 1
+        if bits is not None:
+            w, b = divmod(index, BITS)
+            self.words[np.flatnonzero(np.asarray(bits)[:self.__rows]), w] |= np.uint64(1 << b)
+        return index
+
+    def __getitem__(self, item) -> int:
+        i, j = item
+        w, b = divmod(j, BITS)
+        return int((int(self.words[i, w]) >> b) & 1)
+
+    def __setitem__(self, item, value):
+        i, j = item
+        w, b = divmod(j, BITS)
+        if value:
+            self.words[i, w] |= np.uint64(1 << b)
+        else:
+            self.words[i, w] &= ~np.uint64(1 << b)
+
+    def row(self, i: int) -> RowView:
+        return RowView(self, i)
+
+    def column(self, j: int) -> ColumnView:
+        return ColumnView(self, j)
+
+    def rows(self, rows: Collection[int]) -> np.ndarray:
+        """
+        解压指定的若干行, 形状为 (len(rows), 列数)
+        """
+        return unpack(self.words[list(rows), :self.n_words], self.__cols).reshape(len(rows), self.__cols)
+
+    def columns(self, cols: Collection[int]) -> np.ndarray:
+        """
+        解压指定的若干列, 形状为 (行数, len(cols))
+        """
+        w, b = np.divmod(np.asarray(list(cols), dtype=np.int64), BITS)
+        return ((self.words[:self.__rows][:, w] >> b.astype(WORD)) & np.uint64(1)).astype(np.uint8)
+
+    def block(self, rows: Collection[int], cols: Collection[int], chunk: int = 1024) -> np.ndarray:
+        """
+        解压 rows x cols 的子矩阵, 每次取 chunk 行, 不解压整行
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        w, b = np.divmod(np.asarray(cols, dtype=np.int64), BITS)
+        b = b.astype(WORD)
+        out = np.empty((len(rows), len(w)), dtype=np.uint8)
+        for begin in range(0, len(rows), chunk):
+            words = self.words[rows[begin:begin + chunk]]
+            out[begin:begin + chunk] = (words[:, w] >> b) & np.uint64(1)
+        return out
+
+    def andGroups(self, row_flat: np.ndarray, row_offsets: np.ndarray, col_flat: np.ndarray,
+                  col_offsets: np.ndarray, chunk: int = 4096) -> "BitMatrix":
+        """
+        行分组和列分组的按位与, 分组由 group_indexes 展平. 新矩阵的单元 (a, b) 为第a组行与第b组列交叉处所有单元的与,
+        每次只解压 chunk 个新行
+        """
+        n_rows, n_cols = len(row_offsets), len(col_offsets)
+        mat = BitMatrix(n_rows, n_cols)
+        if n_rows == 0 or n_cols == 0:
+            return mat
+        bounds = np.append(row_offsets, len(row_flat))
+        for begin in range(0, n_rows, chunk):
+            end = min(begin + chunk, n_rows)
+            low, high = bounds[begin], bounds[end]
+            rows = np.bitwise_and.reduceat(self.words[row_flat[low:high], :self.n_words],
+                                           row_offsets[begin:end] - low, axis=0)
+            cells = np.logical_and.reduceat(unpack(rows, self.__cols)[:, col_flat], col_offsets, axis=1)
+            mat.words[begin:end, :mat.n_words] = pack_rows(cells, mat.n_words)
+        return mat
+
+    def orNot(self, other: "BitMatrix"):
+        """
+        同形状的矩阵原地 self |= ~other, 超出列数的位保持为0
+        """
+        n = self.n_words
+        words = self.words[:self.__rows, :n]
+        words |= ~other.words[:self.__rows, :n]
+        tail = self.__cols % BITS
+        if n > 0 and tail > 0:
+            words[:, n - 1] &= np.uint64((1 << tail) - 1)
+
+    def andRows(self, rows: Collection[int]) -> np.ndarray:
+        """
+        多行按位与, 返回打包后的结果
+        """
+        return np.bitwise_and.reduce(self.words[list(rows), :self.n_words], axis=0)
+
+    def count(self) -> int:
+        return popcount(self.words[:self.__rows, :self.n_words])
+
+    def toarray(self) -> np.ndarray:
+        return unpack(self.words[:self.__rows, :self.n_words], self.__cols).reshape(self.__rows, self.__cols)
+
+    def nbytes(self) -> int:
+        return self.words.nbytes
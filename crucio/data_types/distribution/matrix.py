@@ -1,16 +1,17 @@
 import itertools
 import sys
-from typing import Collection, List, Iterable
+from typing import Collection, List, Iterable, Optional
 
 import numpy
 import numpy as np
 
+from crucio.data_types.distribution.bitmatrix import BitMatrix, popcount
 from crucio.utils.sub_con import Sub, Con
-from crucio.oracle.extend.naive import NaiveExtendOracle
+from crucio.oracle.extend import get_extend_oracle
 from crucio.oracle.tokenized import TokenizedOracle
 from crucio.tokenize import TokenizedContext, Tokens
 from crucio.utils.log import terminal, Logger
-from crucio.utils.statistics import timer, timing, record
+from crucio.utils.statistics import timer, timing, record, counting, phase
 
 
 class DistributionalMatrix:
@@ -21,24 +22,24 @@ class DistributionalMatrix:
         self._contexts = list(contexts)
         self._r = len(self._subseqs)
         self._c = len(self._contexts)
-        self._mat = numpy.zeros((self._r, self._c), dtype=np.uint8)
+        self._mat = BitMatrix()
         self._ms, self._msi, = buildMap(self._subseqs)
         self._mc, self._mci = buildMap(self._contexts)
-        self.__oracle = oracle
+        self._oracle = oracle
         self.positives = set()
         examples = list({c.assembly(s) for s, c in itertools.product(self._subseqs, self._contexts)})
         logger.print('Size of examples',sys.getsizeof(examples))
         logger.print('examples=',len(examples))
-        cache = NaiveExtendOracle(oracle).batch(examples,'distributional matrix build')
+        cache = get_extend_oracle(oracle).batch(examples,'distributional matrix build')
         x = timing('cache parse')
-        for s, c in itertools.product(self._subseqs, self._contexts):
-            if cache[c.assembly(s)]:
-                self._mat[self._ms[s]][self._mc[c]] = 1
-                self.positives.add(c.assembly(s))
+        for _ in self._contexts:
+            self._mat.addColumn()
+        for s in self._subseqs:
+            self._mat.addRow(self.__build_row(s, cache.__getitem__))
         record(x)
 
     def getOracle(self):
-        return self.__oracle
+        return self._oracle
 
     def getSubseqByIndex(self, index: int) -> Tokens:
         return self._msi[index]
@@ -56,17 +57,45 @@ class DistributionalMatrix:
         return self._ms[subseq]
 
     def getContextWeight(self, index):
-        return sum(self.getMatrix()[:, index])
+        return self._mat.column(index).count()
 
     def getSubseqWeight(self, index: int):
-        return sum(self.getMatrix()[index])
+        return self._mat.row(index).count()
 
     def getIndexByContext(self, context: TokenizedContext) -> int:
         return self._mc[context]
 
-    def getMatrix(self):
+    def getMatrix(self) -> np.ndarray:
+        """
+        解压后的 uint8 矩阵, 每次调用都会复制, 只读取时用 getBitMatrix
+        """
+        return self._mat.toarray()
+
+    def getBitMatrix(self) -> BitMatrix:
         return self._mat
 
+    def getKnownBits(self) -> Optional[BitMatrix]:
+        """
+        按位压缩的已知单元掩码, None 表示全部已知
+        """
+        return None
+
+    def __build_row(self, subseq: Tokens, parse) -> np.ndarray:
+        row = np.zeros(self._c, dtype=np.uint8)
+        for index, c in enumerate(self.getContexts()):
+            if parse(c.assembly(subseq)):
+                row[index] = 1
+                self.positives.add(c.assembly(subseq))
+        return row
+
+    def __build_column(self, context: TokenizedContext, parse) -> np.ndarray:
+        column = np.zeros(self._r, dtype=np.uint8)
+        for index, s in enumerate(self.getSubseqs()):
+            if parse(context.assembly(s)):
+                column[index] = 1
+                self.positives.add(context.assembly(s))
+        return column
+
     def getSubseqs(self):
         return self._subseqs
 
@@ -83,12 +112,7 @@ class DistributionalMatrix:
         self._contexts.append(context)
         self._c += 1
         # build column
-        newColumn = np.zeros((self._r, 1), dtype=np.uint8)
-        for index, s in enumerate(self.getSubseqs()):
-            if self.__oracle.parse(context.assembly(s)):
-                newColumn[index] = 1
-                self.positives.add(context.assembly(s))
-        self._mat = np.append(self._mat, newColumn, axis=1)
+        self._mat.addColumn(self.__build_column(context, self._oracle.parse))
 
     def addContexts(self, contexts: Collection[TokenizedContext]):
         for context in contexts:
@@ -103,12 +127,7 @@ class DistributionalMatrix:
         self._subseqs.append(subseq)
         self._r += 1
         # 然后构造行
-        newRow = np.zeros((1, self._c), dtype=np.uint8)
-        for index, c in enumerate(self.getContexts()):
-            if self.__oracle.parse(c.assembly(subseq)):
-                newRow[0, index] = 1
-                self.positives.add(c.assembly(subseq))
-        self._mat = np.append(self._mat, newRow, axis=0)
+        self._mat.addRow(self.__build_row(subseq, self._oracle.parse))
 
     @timer('distributional matrix build')
     def addExample(self,example):
@@ -121,19 +140,14 @@ class DistributionalMatrix:
         for sub in self._subseqs+subseqs:
             for con in contexts:
                 examples.add(con.assembly(sub))
-        cache = NaiveExtendOracle(self.__oracle).batch(examples,'distributional matrix construct')
+        cache = get_extend_oracle(self._oracle).batch(examples,'distributional matrix construct')
         for subseq in subseqs:
             self._ms[subseq] = len(self._ms)
             self._msi[self._ms[subseq]] = subseq
             self._subseqs.append(subseq)
             self._r += 1
             # 然后构造行
-            newRow = np.zeros((1, self._c), dtype=np.uint8)
-            for index, c in enumerate(self.getContexts()):
-                if cache[c.assembly(subseq)]:
-                    newRow[0, index] = 1
-                    self.positives.add(c.assembly(subseq))
-            self._mat = np.append(self._mat, newRow, axis=0)
+            self._mat.addRow(self.__build_row(subseq, cache.__getitem__))
         for context in contexts:
             # 首先维护映射
             self._mc[context] = len(self._mc)
@@ -141,18 +155,114 @@ class DistributionalMatrix:
             self._contexts.append(context)
             self._c += 1
             # 然后构造列
-            newColumn = np.zeros((self._r, 1), dtype=np.uint8)
-            for index, s in enumerate(self.getSubseqs()):
-                if cache[context.assembly(s)]:
-                    newColumn[index] = 1
-                    self.positives.add(context.assembly(s))
-            self._mat = np.append(self._mat, newColumn, axis=1)
+            self._mat.addColumn(self.__build_column(context, cache.__getitem__))
 
     def addSubseqs(self, subseqs: Collection[Tokens]):
         for subseq in subseqs:
             self.addSubseq(subseq)
 
 
+class LazyDistributionalMatrix(DistributionalMatrix):
+    """
+    惰性分布矩阵, 单元只在被读取时查询oracle并缓存.
+    未知单元在 getMatrix 中按1处理, 配合 getKnownBits 使用
+    """
+
+    def __init__(self, subseqs: Collection[Tokens], contexts: Collection[TokenizedContext], oracle: TokenizedOracle,
+                 logger: Logger = terminal):
+        self._subseqs = []
+        self._contexts = []
+        self._r = 0
+        self._c = 0
+        self._mat = BitMatrix()
+        self._known = BitMatrix()
+        self._ms, self._msi = {}, {}
+        self._mc, self._mci = {}, {}
+        self._oracle = oracle
+        self.positives = set()
+        self.materialised = 0
+        for subseq in subseqs:
+            self.addSubseq(subseq)
+        for context in contexts:
+            self.addContext(context)
+        logger.print('lazy distributional matrix', self._r, 'x', self._c)
+
+    def addSubseq(self, subseq: Tokens):
+        if subseq in self._ms:
+            return
+        self._ms[subseq] = len(self._ms)
+        self._msi[self._ms[subseq]] = subseq
+        self._subseqs.append(subseq)
+        self._r += 1
+        self._mat.addRow(np.ones(self._c, dtype=np.uint8))
+        self._known.addRow()
+
+    def addContext(self, context: TokenizedContext):
+        if context in self._mc:
+            return
+        self._mc[context] = len(self._mc)
+        self._mci[self._mc[context]] = context
+        self._contexts.append(context)
+        self._c += 1
+        self._mat.addColumn(np.ones(self._r, dtype=np.uint8))
+        self._known.addColumn()
+
+    def addExample(self, example):
+        for subseq in Sub(example):
+            self.addSubseq(subseq)
+        for context in Con(example):
+            self.addContext(context)
+
+    def isKnown(self, row: int, col: int) -> bool:
+        return self._known[row, col] == 1
+
+    def peek(self, row: int, col: int) -> int:
+        """
+        不查询oracle, 未知单元返回1
+        """
+        return self._mat[row, col]
+
+    @timer('lazy distributional matrix')
+    @phase('DM build')
+    def prefetch(self, cells: Iterable, desc='lazy distributional matrix'):
+        """
+        批量查询所有未知单元
+        :param cells: (行, 列) 的集合
+        """
+        todo = {(i, j) for i, j in cells if not self.isKnown(i, j)}
+        if len(todo) == 0:
+            return
+        examples = {cell: self._mci[cell[1]].assembly(self._msi[cell[0]]) for cell in todo}
+        cache = get_extend_oracle(self._oracle).batch(set(examples.values()), desc)
+        for (i, j), example in examples.items():
+            self._mat[i, j] = cache[example]
+            self._known[i, j] = 1
+            if cache[example]:
+                self.positives.add(example)
+        self.materialised += len(todo)
+        counting('lazy distributional matrix cells', len(todo))
+
+    def prefetchBlock(self, rows: Collection[int], cols: Collection[int]):
+        self.prefetch(itertools.product(rows, cols))
+
+    def get(self, row: int, col: int) -> int:
+        if not self.isKnown(row, col):
+            self.prefetch([(row, col)])
+        return self._mat[row, col]
+
+    def getKnownBits(self) -> Optional[BitMatrix]:
+        return self._known
+
+    def getContextWeight(self, index):
+        """
+        只统计已知的正例
+        """
+        return int((self._mat.column(index).toarray() & self._known.column(index).toarray()).sum())
+
+    def getSubseqWeight(self, index: int):
+        return popcount(self._mat.row(index).words() & self._known.row(index).words())
+
+
 def buildMap(s: Iterable):
     m1 = {item: index for index, item in enumerate(s)}
     m2 = {v: k for k, v in m1.items()}
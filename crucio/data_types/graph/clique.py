@@ -0,0 +1,473 @@
+"""
+基于位集的极大团枚举, 直接读取交换图的邻接矩阵
+"""
+import heapq
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import List, Set, FrozenSet, Dict, Iterator, Optional, Tuple, Hashable
+
+import numpy as np
+
+from crucio.utils.statistics import timer, counting, hitRecorder, missRecorder
+
+if hasattr(int, 'bit_count'):
+    def popcount(x: int) -> int:
+        return x.bit_count()
+else:
+    def popcount(x: int) -> int:
+        return bin(x).count('1')
+
+
+def bits(x: int) -> Iterator[int]:
+    """
+    位集中的节点, 从小到大
+    """
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def to_bitsets(adj: np.ndarray) -> List[int]:
+    """
+    邻接矩阵的每一行转为Python int位集, 忽略对角线
+    """
+    n = adj.shape[0]
+    if n == 0:
+        return []
+    adj = np.asarray(adj, dtype=np.bool_).copy()
+    np.fill_diagonal(adj, False)
+    packed = np.packbits(adj, axis=1, bitorder='little')
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+def degeneracy_order(nbrs, nodes: int) -> List[int]:
+    """
+    退化序: 每次取出剩余子图中度最小的节点
+    :param nbrs: 每个节点的邻居位集
+    :param nodes: 参与排序的节点位集
+    """
+    degree = {v: popcount(nbrs[v] & nodes) for v in bits(nodes)}
+    buckets: Dict[int, Set[int]] = defaultdict(set)
+    for v, d in degree.items():
+        buckets[d].add(v)
+    order = []
+    remaining = nodes
+    d = 0
+    while remaining:
+        # 取出一个节点后最小度至多减一
+        d = max(d - 1, 0)
+        while not buckets[d]:
+            d += 1
+        v = min(buckets[d])
+        buckets[d].remove(v)
+        order.append(v)
+        remaining &= ~(1 << v)
+        for u in bits(nbrs[v] & remaining):
+            buckets[degree[u]].remove(u)
+            degree[u] -= 1
+            buckets[degree[u]].add(u)
+    return order
+
+
+def bron_kerbosch(nbrs, nodes: int) -> List[List[int]]:
+    """
+    Bron–Kerbosch, 顶层按退化序展开, 递归时按Tomita规则选取枢轴
+    """
+    cliques = []
+
+    def expand(r: List[int], p: int, x: int):
+        if not p and not x:
+            cliques.append(r)
+            return
+        pivot = max(bits(p | x), key=lambda u: popcount(p & nbrs[u]))
+        for v in bits(p & ~nbrs[pivot]):
+            expand(r + [v], p & nbrs[v], x & nbrs[v])
+            p &= ~(1 << v)
+            x |= 1 << v
+
+    before = 0
+    after = nodes
+    for v in degeneracy_order(nbrs, nodes):
+        after &= ~(1 << v)
+        expand([v], nbrs[v] & after, nbrs[v] & before)
+        before |= 1 << v
+    return cliques
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        枚举的截止时间, None不限
+        """
+        self.at = None
+        self.start(seconds)
+
+    def start(self, seconds: Optional[float]):
+        self.at = None if seconds is None else time.time() + seconds
+
+    def expired(self) -> bool:
+        return self.at is not None and time.time() > self.at
+
+
+def cliques_by_size(nbrs, nodes: int, weights, deadline: Optional[Deadline] = None,
+                    maxStates: int = 1 << 16) -> Iterator[Optional[List[int]]]:
+    """
+    按权重和从大到小惰性生成极大团.
+    在Bron–Kerbosch的搜索树上做最佳优先搜索, 状态(R, P, X)的上界为 w(R) 加上P的贪心着色界;
+    叶子(P, X 均为空)的上界等于团的大小, 出堆时其余状态的上界都不超过它.
+    堆中超过 maxStates 个状态时改为逐层的深度优先搜索, 每层只生成权重恰好为该层的团, 内存只剩搜索栈.
+    :param nbrs: 节点 -> 邻居位集
+    :param weights: 节点权重, 收缩后为组的大小
+    :param deadline: 展开状态时也检查, 超时后生成None暂停, 继续迭代时从暂停处恢复
+    """
+
+    def weight(x: int) -> int:
+        # 每个颜色类是独立集, 团在每类中至多取一个节点
+        total = 0
+        while x:
+            heaviest = 0
+            available = x
+            while available:
+                v = (available & -available).bit_length() - 1
+                heaviest = max(heaviest, weights[v])
+                x &= ~(1 << v)
+                available &= ~nbrs[v] & ~(1 << v)
+            total += heaviest
+        return total
+
+    def children(r_weight: int, r: List[int], p: int, x: int):
+        pivot = max(bits(p | x), key=lambda u: popcount(p & nbrs[u]))
+        for v in bits(p & ~nbrs[pivot]):
+            while deadline is not None and deadline.expired():
+                yield None
+            child_p, child_x = p & nbrs[v], x & nbrs[v]
+            p &= ~(1 << v)
+            x |= 1 << v
+            # X中有节点与P全部相邻时, 子树中没有极大团
+            if any(child_p & ~nbrs[u] == 0 for u in bits(child_x)):
+                continue
+            child_weight = r_weight + weights[v]
+            yield child_weight + weight(child_p), child_weight, r + [v], child_p, child_x
+
+    if not nodes:
+        return
+    heap = [(-weight(nodes), 0, 0, [], nodes, 0)]
+    pushed = 1
+    # 最近生成的、权重相同的团, 改为逐层搜索时跳过
+    last_weight, last = None, set()
+    while heap:
+        while deadline is not None and deadline.expired():
+            yield None
+        _, _, r_weight, r, p, x = heapq.heappop(heap)
+        if not p:
+            if not x:
+                if r_weight != last_weight:
+                    last_weight, last = r_weight, set()
+                last.add(frozenset(r))
+                yield r
+            continue
+        for child in children(r_weight, r, p, x):
+            if child is None:
+                yield None
+                continue
+            bound, child_weight, child_r, child_p, child_x = child
+            heapq.heappush(heap, (-bound, pushed, child_weight, child_r, child_p, child_x))
+            pushed += 1
+        if len(heap) > maxStates:
+            break
+    if not heap:
+        return
+    counting('clique heap overflows')
+    # 还没生成的团权重都不超过堆顶的上界
+    top = -heap[0][0]
+    heap = None
+    for level in range(top, 0, -1):
+        stack = [(0, [], nodes, 0)]
+        while stack:
+            while deadline is not None and deadline.expired():
+                yield None
+            r_weight, r, p, x = stack.pop()
+            if not p:
+                if not x and r_weight == level and not (level == last_weight and frozenset(r) in last):
+                    yield r
+                continue
+            for child in children(r_weight, r, p, x):
+                if child is None:
+                    yield None
+                    continue
+                bound, child_weight, child_r, child_p, child_x = child
+                if bound >= level:
+                    stack.append((child_weight, child_r, child_p, child_x))
+
+
+class BitsetGraph:
+    def __init__(self, adj: np.ndarray):
+        """
+        无向图, 节点为邻接矩阵的下标, 没有边的节点不在图中(与 build_graph 一致)
+        :param adj: 对称的0/1邻接矩阵
+        """
+        self.n = adj.shape[0]
+        self.nbrs = to_bitsets(adj)
+
+    def getNodes(self) -> List[int]:
+        return [i for i in range(self.n) if self.nbrs[i]]
+
+    def getNbrs(self, node: int) -> Set[int]:
+        return set(bits(self.nbrs[node]))
+
+    def twins(self) -> Dict[int, List[int]]:
+        """
+        闭邻域相同的节点必然同时出现在极大团中, 按闭邻域分组
+        :return: 代表节点 -> 组内节点
+        """
+        groups = defaultdict(list)
+        for v in self.getNodes():
+            groups[self.nbrs[v] | (1 << v)].append(v)
+        return {group[0]: group for group in groups.values()}
+
+    @timer('getMaximalCliques')
+    def getMaximalCliques(self, nodeContract: bool = True) -> Set[FrozenSet[int]]:
+        """
+        与 UndirectedGraph.getFastMaximalCliques 结果相同
+        :param nodeContract: 先合并闭邻域相同的节点
+        """
+        nbrs, groups = self.contract(nodeContract)
+        return {frozenset(u for v in clique for u in groups[v])
+                for clique in bron_kerbosch(nbrs, sum(1 << v for v in groups))}
+
+    def components(self) -> List[int]:
+        """
+        连通分量的节点位集, 按最小节点排序
+        """
+        ans = []
+        remaining = sum(1 << v for v in self.getNodes())
+        while remaining:
+            component = frontier = remaining & -remaining
+            while frontier:
+                v = (frontier & -frontier).bit_length() - 1
+                frontier &= ~(1 << v)
+                new = self.nbrs[v] & ~component
+                component |= new
+                frontier |= new
+            ans.append(component)
+            remaining &= ~component
+        return ans
+
+    def contract(self, nodeContract: bool = True, nodes: Optional[int] = None) -> Tuple[Dict[int, int], Dict[int, List[int]]]:
+        """
+        :param nodes: 只保留这些节点, None为全部
+        :return: 收缩后每个代表节点的邻居位集(只保留代表节点之间的边), 代表节点 -> 组内节点
+        """
+        if nodeContract:
+            groups = self.twins()
+        else:
+            groups = {v: [v] for v in self.getNodes()}
+        if nodes is not None:
+            groups = {v: group for v, group in groups.items() if nodes >> v & 1}
+        representatives = sum(1 << v for v in groups)
+        return {v: self.nbrs[v] & representatives for v in groups}, groups
+
+
+def capped(cliques: Iterator[FrozenSet], maxTime: Optional[float], maxCount: Optional[int]) -> Iterator[FrozenSet]:
+    start = time.time()
+    for count, clique in enumerate(cliques):
+        if maxCount is not None and count >= maxCount:
+            return
+        if maxTime is not None and time.time() - start > maxTime:
+            return
+        counting('cliques generated')
+        yield clique
+
+
+def component_cliques(nbrs: Dict[int, int], groups: Dict[int, List[int]], maxTime: float,
+                      maxCount: int) -> Tuple[List[List[int]], bool]:
+    """
+    在进程池中枚举一个连通分量最大的若干个极大团, 从大到小
+    :return: 团, 以及是否已经全部枚举
+    """
+    cliques = cliques_by_size(nbrs, sum(1 << v for v in groups), {v: len(group) for v, group in groups.items()},
+                              Deadline(maxTime))
+    ans = []
+    for clique in cliques:
+        if clique is None:
+            return ans, False
+        ans.append([u for v in clique for u in groups[v]])
+        if len(ans) >= maxCount:
+            return ans, False
+    return ans, True
+
+
+def labelled(cliques: Iterator[Optional[List[int]]], groups: Dict[int, List[int]],
+             labels: List[Hashable]) -> Iterator[Optional[FrozenSet]]:
+    """
+    收缩后的团展开为组内节点的标签, 保留暂停的None
+    """
+    for clique in cliques:
+        yield None if clique is None else frozenset(labels[u] for v in clique for u in groups[v])
+
+
+class CliqueStream:
+    def __init__(self, source: Optional[Iterator[Optional[FrozenSet]]]):
+        """
+        一个连通分量的极大团, 已生成的部分保存下来, 下一轮迭代分量不变时从头重放
+        :param source: 生成None时枚举超时暂停, 本次迭代结束, 下次迭代从暂停处继续
+        """
+        self.cliques: List[FrozenSet] = []
+        self.source = source
+        # source 中已由进程池生成、需要跳过的团数
+        self.skip = 0
+
+    def prefetched(self, cliques: List[FrozenSet], complete: bool):
+        """
+        进程池生成的前若干个团, 与 source 的顺序相同
+        """
+        self.cliques = cliques
+        if complete:
+            self.source = None
+        else:
+            self.skip = len(cliques)
+
+    def __iter__(self) -> Iterator[FrozenSet]:
+        i = 0
+        while True:
+            if i < len(self.cliques):
+                yield self.cliques[i]
+                i += 1
+                continue
+            if self.source is None:
+                return
+            clique = next(self.source, False)
+            if clique is False:
+                self.source = None
+                return
+            if clique is None:
+                return
+            if self.skip:
+                self.skip -= 1
+                continue
+            self.cliques.append(clique)
+
+
+class ComponentCliqueSearch:
+    # 没有限制时进程池为每个分量预先生成的团数和秒数, 其余的在本进程中按需生成
+    prefetchCount = 64
+    prefetchTime = 1.0
+
+    def __init__(self, workers: int = 0):
+        """
+        按连通分量查找极大团, 分量用节点标签(bubble)和边表示, 跨迭代不变的分量直接复用之前的结果
+        :param workers: >1 时未缓存的分量先在进程池中生成最大的若干个团
+        """
+        self.workers = workers
+        self.__cache: Dict[FrozenSet, CliqueStream] = {}
+        self.__pool = None
+        self.__deadline = Deadline()
+
+    def search(self, graph: BitsetGraph, labels: List[Hashable], nodeContract: bool = True,
+               maxTime: Optional[float] = None, maxCount: Optional[int] = None) -> Iterator[FrozenSet[int]]:
+        """
+        极大团按大小从大到小惰性生成, 只取前几个时不必枚举全部; 每个分量单独枚举, 分量之间按大小归并
+        :param maxTime: 最多枚举的秒数, None不限
+        :param maxCount: 最多生成的团数, None不限
+        :param labels: 节点下标 -> 标签
+        """
+        # 所有分量共用本次迭代的截止时间, 缓存的分量在下次迭代中继续枚举
+        self.__deadline.start(maxTime)
+        index = {label: i for i, label in enumerate(labels)}
+        streams = []
+        cache = {}
+        pending = []
+        for component in graph.components():
+            key = frozenset((labels[v], frozenset(labels[u] for u in bits(graph.nbrs[v]))) for v in bits(component))
+            stream = self.__cache.get(key)
+            if stream is None:
+                missRecorder('component cliques')
+                nbrs, groups = graph.contract(nodeContract, component)
+                cliques = cliques_by_size(nbrs, sum(1 << v for v in groups), {v: len(group) for v, group in groups.items()},
+                                          self.__deadline)
+                stream = CliqueStream(labelled(cliques, groups, labels))
+                pending.append((nbrs, groups, stream))
+            else:
+                hitRecorder('component cliques')
+            cache[key] = stream
+            streams.append(stream)
+        # 消失的分量不再保留
+        self.__cache = cache
+        if self.workers > 1 and len(pending) > 1:
+            self.prefetch(pending, labels, maxTime, maxCount)
+        merged = heapq.merge(*streams, key=len, reverse=True)
+        return capped((frozenset(index[label] for label in clique) for clique in merged), maxTime, maxCount)
+
+    def prefetch(self, pending, labels: List[Hashable], maxTime: Optional[float], maxCount: Optional[int]):
+        """
+        进程池中为每个新分量生成最大的若干个团, 等待不超过时间预算; 超时的分量留给本进程按需生成
+        """
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(self.workers)
+        budget = self.prefetchTime if maxTime is None else maxTime
+        count = self.prefetchCount if maxCount is None else maxCount
+        futures = [self.__pool.submit(component_cliques, nbrs, groups, budget, count) for nbrs, groups, _ in pending]
+        # 工作进程自己在预算内停止, 另留一秒给进程间传输
+        end = time.time() + budget + 1
+        for (_, _, stream), future in zip(pending, futures):
+            try:
+                cliques, complete = future.result(timeout=max(end - time.time(), 0))
+            except TimeoutError:
+                future.cancel()
+                missRecorder('prefetched component cliques')
+                continue
+            hitRecorder('prefetched component cliques')
+            stream.prefetched([frozenset(labels[v] for v in clique) for clique in cliques], complete)
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+
+graphRecords = 0
+
+
+def record_graph(adj: np.ndarray, directory: str):
+    """
+    保存交换图的邻接矩阵, 供 __main__ 中的基准测试使用
+    """
+    global graphRecords
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, f'graph_{graphRecords}.npy'), np.packbits(adj, axis=1))
+    np.save(os.path.join(directory, f'graph_{graphRecords}.shape.npy'), np.array(adj.shape))
+    graphRecords += 1
+
+
+def load_graph(path: str) -> np.ndarray:
+    shape = np.load(path.replace('.npy', '.shape.npy'))
+    return np.unpackbits(np.load(path), axis=1)[:, :shape[1]].astype(np.bool_)
+
+
+if __name__ == '__main__':
+    # python -m crucio.data_types.graph.clique [记录的图...], 没有参数时用随机图
+    import sys
+    import time
+    from crucio.inference.update_graph.envs.util import build_graph
+
+    paths = [i for i in sys.argv[1:] if not i.endswith('.shape.npy')]
+    if paths:
+        graphs = [(path, load_graph(path)) for path in paths]
+    else:
+        rng = np.random.default_rng(0)
+        graphs = []
+        for n, density in [(100, 0.3), (200, 0.3), (400, 0.2), (800, 0.1)]:
+            adj = np.triu(rng.random((n, n)) < density, 1)
+            graphs.append((f'random {n} {density}', adj | adj.T))
+    for name, adj in graphs:
+        start = time.time()
+        cliques = BitsetGraph(adj).getMaximalCliques(True)
+        bitset = time.time() - start
+        start = time.time()
+        expected = build_graph(adj).getFastMaximalCliques(True)
+        old = time.time() - start
+        assert cliques == expected
+        print(f'{name}: {len(cliques)} cliques, bitset {bitset:.3f}s, UndirectedGraph {old:.3f}s')
@@ -31,23 +31,22 @@ class UndirectedGraph(DirectedGraph):
         :return: 强联通分量
         """
         visited = set()
-        scc = set()
         sccs = set()
-
-        def dfs(current):
-            if current in visited:
-                return
-            scc.add(current)
-            visited.add(current)
-            for nbr in self.getNbrs(current):
-                dfs(nbr)
-
         for node in self.getNodes():
             if node in visited:
                 continue
-            dfs(node)
-            sccs.add(frozenset(scc))
+            # 用栈代替递归, 大的分量不会超过递归深度
             scc = set()
+            stack = [node]
+            visited.add(node)
+            while stack:
+                current = stack.pop()
+                scc.add(current)
+                for nbr in self.getNbrs(current):
+                    if nbr not in visited:
+                        visited.add(nbr)
+                        stack.append(nbr)
+            sccs.add(frozenset(scc))
         return sccs
 
     def __getMaximalCliquesContracted(self) -> Set[FrozenSet]:
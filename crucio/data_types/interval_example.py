@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from colored import attr, bg
 
 from crucio.tokenize import Tokens, Token, TokenizedContext
+from crucio.tokenize.span import Span, SpanContext
 from crucio.utils import str1
 from crucio.utils.statistics import timer
 
@@ -28,13 +29,13 @@ class IntervalExample:
         return self.example[:self.left]
 
     def value(self):
-        return self.example[self.left:self.right]
+        return Span.of(self.example, self.left, self.right)
 
     def suffix(self):
         return self.example[self.right:]
 
     def context(self):
-        return TokenizedContext(self.prefix(), self.suffix())
+        return SpanContext.of(self.example, self.left, self.right)
 
 
 @timer('isConflict')
@@ -2,7 +2,7 @@ from typing import Optional
 
 from crucio.decompose.strategy.RemoveBlock import BinaryRemoveBlockDecomposer, RemoveBlockDecomposer
 from crucio.decompose.strategy.SubSeq import SubSeqDecomposer
-from crucio.utils.statistics import timer, counting
+from crucio.utils.statistics import timer, counting, phase
 from crucio.decompose.decompose_forest.search import ForestSearcher
 from crucio.data_types.learn_teach import Teacher
 
@@ -20,7 +20,10 @@ def de_func(example, oracle):
     brb = BinaryRemoveBlockDecomposer()
     for i in brb.decompose(example):
         start = oracle.raw().calls
-        if oracle.parse(i):
+        # not around the yield, the consumer runs in between
+        with phase('decompose'):
+            ok = oracle.parse(i)
+        if ok:
             counting('decompose', oracle.raw().calls-start)
             yield i
         else:
@@ -28,7 +31,9 @@ def de_func(example, oracle):
     rb = RemoveBlockDecomposer()
     for i in rb.decompose(example):
         start = oracle.raw().calls
-        if oracle.parse(i):
+        with phase('decompose'):
+            ok = oracle.parse(i)
+        if ok:
             counting('decompose', oracle.raw().calls-start)
             yield i
         else:
@@ -36,7 +41,9 @@ def de_func(example, oracle):
     ssb = SubSeqDecomposer()
     for i in ssb.decompose(example):
         start = oracle.raw().calls
-        if oracle.parse(i):
+        with phase('decompose'):
+            ok = oracle.parse(i)
+        if ok:
             counting('decompose', oracle.raw().calls-start)
             yield i
         else:
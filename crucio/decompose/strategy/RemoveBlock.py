@@ -1,6 +1,6 @@
 from typing import Iterator
 
-from crucio.grammar_tool import checkBalance
+from crucio.grammar_tool.balance import BalanceIndex
 from crucio.decompose.strategy import DataDecomposer
 from crucio.tokenize import Tokens
 from crucio.utils.subseq import SubSeqIterator
@@ -9,11 +9,11 @@ from crucio.utils.subseq import SubSeqIterator
 class RemoveBlockDecomposer(DataDecomposer):
     def decompose(self, tokens: Tokens) -> Iterator[Tokens]:
         ssi = SubSeqIterator(tokens)
+        index = BalanceIndex(tokens)
         for l, r in ssi:
-            subseq = tokens[:l] + tokens[r:]
-            if not checkBalance(subseq):
+            if not index.balancedWithout(l, r):
                 continue
-            yield subseq
+            yield tokens[:l] + tokens[r:]
 
 
 class BinaryRemoveBlockDecomposer(DataDecomposer):
@@ -24,25 +24,24 @@ class BinaryRemoveBlockDecomposer(DataDecomposer):
 
         ssi1 = iter(SubSeqIterator(prefix))
         ssi2 = iter(SubSeqIterator(suffix))
+        index = BalanceIndex(tokens)
         flag = True
         while flag:
             flag = False
             try:
                 l, r = next(ssi1)
                 flag = True
-                subseq = prefix[:l] + prefix[r:] + suffix
-                if not checkBalance(subseq):
+                if not index.balancedWithout(l, r):
                     continue
-                yield subseq
+                yield prefix[:l] + prefix[r:] + suffix
             except StopIteration:
                 pass
             try:
                 l, r = next(ssi2)
                 flag = True
-                subseq = prefix + suffix[:l] + suffix[r:]
-                if not checkBalance(subseq):
+                if not index.balancedWithout(mid + l, mid + r):
                     continue
-                yield subseq
+                yield prefix + suffix[:l] + suffix[r:]
             except StopIteration:
                 pass
 
@@ -1,6 +1,7 @@
 from typing import Iterator
 
 from crucio.grammar_tool import checkBalance
+from crucio.grammar_tool.balance import BalanceIndex
 from crucio.decompose.strategy import DataDecomposer
 from crucio.tokenize import Tokens
 from crucio.utils.subseq import SubSeqIterator
@@ -9,11 +10,20 @@ from crucio.utils.subseq import SubSeqIterator
 class SubSeqDecomposer(DataDecomposer):
     def decompose(self, tokens: Tokens) -> Iterator[Tokens]:
         ssi1 = SubSeqIterator(tokens)
+        index = BalanceIndex(tokens)
         for l1, r1 in ssi1:
-            ssi2 = SubSeqIterator(tokens[l1:r1])
+            ssi2 = SubSeqIterator(r1 - l1)
             for l2, r2 in ssi2:
-                subseq = tokens[:l1] + tokens[l1:r1][l2:r2] + tokens[r1:]
-                if not checkBalance(subseq) or len(subseq) >= len(tokens):
+                if l2 == 0 and r2 == r1 - l1:
+                    continue
+                # tokens[l1 + l2:l1 + r2] balanced leaves the stack as it is, only the outer part matters
+                if index.balanced(l1 + l2, l1 + r2):
+                    if not index.balancedWithout(l1, r1):
+                        continue
+                    yield tokens[:l1] + tokens[l1 + l2:l1 + r2] + tokens[r1:]
+                    continue
+                subseq = tokens[:l1] + tokens[l1 + l2:l1 + r2] + tokens[r1:]
+                if not checkBalance(subseq):
                     continue
                 yield subseq
 
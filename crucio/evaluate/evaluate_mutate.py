@@ -3,15 +3,18 @@ from typing import Collection
 
 from tqdm import tqdm
 
+from crucio.config import Config
 from crucio.data_types import Grammar
 from crucio.evaluate.mutate.mutate_examples import evaluateSwapPrecision
+from crucio.grammar_tool.cyk import CYKRecognizer
 from crucio.instantiate.node.core.node_grow.per_prod_limit import PerProdLimitSNG
 from crucio.instantiate.symbol.symbol_ins import SngSymbolInstantiator
-from crucio.oracle.extend.naive import NaiveExtendOracle
+from crucio.oracle.extend import get_extend_oracle
 from crucio.oracle.tokenized import TokenizedOracle
 from crucio.tokenize import Tokens, Tokenizer
 from crucio.utils import str1, harmonic_mean
 from crucio.utils.log import Logger, dummy
+from crucio.utils.statistics import phase
 from crucio.utils.time_out import timeout
 
 from dataclasses import dataclass
@@ -58,6 +61,7 @@ def parse_timeout(oracle, example):
     return oracle.parse(example)
 
 
+@phase('evaluation')
 def evaluateGrammarPm2(grammar: Grammar, oracle: TokenizedOracle, testSet: Collection[str], tokenizer: Tokenizer,
                        logger: Logger = dummy):
     from crucio.utils.global_bar import rqdm
@@ -68,7 +72,7 @@ def evaluateGrammarPm2(grammar: Grammar, oracle: TokenizedOracle, testSet: Colle
     precision = 0
     total = 0
     print('Parsing precision set')
-    NaiveExtendOracle(oracle).batch(precisionSet, '解析样本')
+    get_extend_oracle(oracle).batch(precisionSet, '解析样本')
     for tokens in rqdm(precisionSet):
         logger.print(oracle.ins(tokens))
         total += 1
@@ -81,7 +85,7 @@ def evaluateGrammarPm2(grammar: Grammar, oracle: TokenizedOracle, testSet: Colle
     print('pS=', precision / total)
     print('Eval of recall:')
     logger.print('Eval of recall:')
-    grammarOracle = grammar.getOracle()
+    grammarOracle = None if Config.batchRecall else grammar.getOracle()
     # 0.0319
     tokenized = []
     start = time.time()
@@ -92,11 +96,15 @@ def evaluateGrammarPm2(grammar: Grammar, oracle: TokenizedOracle, testSet: Colle
             logger.print(i)
             logger.print('Failed by lexical')
 
+    if Config.batchRecall:
+        # 按长度分组一次识别, 不再逐个经过Lark
+        accepted = CYKRecognizer.fromGrammar(grammar).recognize_many([[token.code for token in tokens]
+                                                                      for tokens in tokenized])
     parsed = set()
-    for tokens in rqdm(tokenized):
+    for i, tokens in enumerate(rqdm(tokenized)):
         logger.print(oracle.ins(tokens))
         logger.print(str1(tokens))
-        if parse_timeout(grammarOracle,tokens):
+        if accepted[i] if Config.batchRecall else parse_timeout(grammarOracle, tokens):
             logger.print("Passed")
             parsed.add(tokens)
             recall += 1
@@ -4,7 +4,7 @@ from typing import Collection
 
 from crucio.grammar_tool.Parser import STParser
 from crucio.grammar_tool.extract_con_sub import extractCS
-from crucio.oracle.extend.naive import NaiveExtendOracle
+from crucio.oracle.extend import get_extend_oracle
 from crucio.tokenize import Tokens
 from crucio.utils import str1
 from crucio.utils.log import Logger
@@ -64,6 +64,6 @@ def mutateExamples2(parser, examples: Collection[Tokens]):
 def evaluateSwapPrecision(examples, grammar, oracle):
     parser = STParser(grammar)
     mutated = mutateExamples2(parser, examples)
-    NaiveExtendOracle(oracle).batch(mutated,'解析样本')
+    get_extend_oracle(oracle).batch(mutated,'解析样本')
     return len({i for i in mutated if oracle.parse(i)}) / len(mutated) if len(mutated) > 0 else 1
 
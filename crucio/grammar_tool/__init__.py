@@ -20,6 +20,11 @@ def checkRealBalance(tokens: Tokens) -> bool:
 def checkBalance(tokens: Tokens) -> bool:
     if Config.noBalanceCheck:
         return True
+    from crucio.tokenize.span import Span
+    if isinstance(tokens, Span):
+        # spans are answered by the index of their example
+        from crucio.grammar_tool.balance import balance_index
+        return balance_index(tokens.example(), tokens.table).balanced(tokens.left, tokens.right)
     if Config.realInfer:
         return checkRealBalance(tokens)
     ps = [('L_BRA', 'R_BRA'), ('L_SB', 'R_SB'), ('L_PAREN', 'R_PAREN'), ('L_VIRTUAL', 'R_VIRTUAL')]
@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from crucio.config import Config
+from crucio.tokenize import Tokens, Token
+
+REAL_PAIRS = {'(': (0, 1), ')': (0, -1), '[': (1, 1), ']': (1, -1), '{': (2, 1), '}': (2, -1)}
+TYPE_PAIRS = {'L_BRA': (0, 1), 'R_BRA': (0, -1), 'L_SB': (1, 1), 'R_SB': (1, -1),
+              'L_PAREN': (2, 1), 'R_PAREN': (2, -1), 'L_VIRTUAL': (3, 1), 'R_VIRTUAL': (3, -1)}
+
+
+def balance_mode() -> str:
+    if Config.noBalanceCheck:
+        return 'none'
+    if Config.realInfer:
+        return 'real'
+    return 'type'
+
+
+def bracket(token: Token, mode: str) -> Optional[Tuple[object, int]]:
+    """
+    the bracket kind of `token` and +1 for opening, -1 for closing, None if it is not a bracket.
+    Same pairs as checkRealBalance/checkBalance, virtual pairs L_VP*/R_VP* match on the name after L/R.
+    """
+    if mode == 'real':
+        return REAL_PAIRS.get(token.value)
+    if token.type in TYPE_PAIRS:
+        return TYPE_PAIRS[token.type]
+    if token.type.startswith('L_VP'):
+        return token.type[1:], 1
+    if token.type.startswith('R_VP'):
+        return token.type[1:], -1
+    return None
+
+
+class BalanceIndex:
+    def __init__(self, tokens: Tokens, mode: Optional[str] = None):
+        """
+        Precomputed bracket structure of one example, answers checkBalance on a span or on the example
+        with a block removed in O(1).
+        :param mode: 'real', 'type' or 'none', defaults to the current Config
+        """
+        self.mode = balance_mode() if mode is None else mode
+        self.n = n = len(tokens)
+        brackets = [None] * n if self.mode == 'none' else [bracket(token, self.mode) for token in tokens]
+        # depth[i]: opening minus closing brackets in tokens[:i]
+        depth = [0] * (n + 1)
+        # a closing bracket whose partner (by depth) has another kind is a barrier no balanced span contains
+        barrier = [False] * n
+        opened = []
+        for i, b in enumerate(brackets):
+            depth[i + 1] = depth[i]
+            if b is None:
+                continue
+            kind, direction = b
+            depth[i + 1] += direction
+            if direction > 0:
+                opened.append(kind)
+            elif opened:
+                barrier[i] = opened.pop() != kind
+        self.depth = depth
+        # limit[l]: the largest r such that no span [l, r) dips below depth[l] or contains a barrier
+        reach = [n + 1] * (n + 1)
+        stack = []
+        for k in range(n + 1):
+            while stack and depth[k] < depth[stack[-1]]:
+                reach[stack.pop()] = k
+            stack.append(k)
+        next_barrier = n
+        self.limit = [0] * (n + 1)
+        for l in range(n, -1, -1):
+            if l < n and barrier[l]:
+                next_barrier = l
+            self.limit[l] = min(reach[l] - 1, next_barrier)
+        # stack states as trie nodes: forward[i] after tokens[:i], backward[i] scanning tokens[i:] from the right,
+        # -1 once the scan failed. tokens[:l] + tokens[r:] is balanced iff forward[l] == backward[r] != -1
+        trie: Dict[Tuple[int, object], int] = {}
+        parent = [-1]
+        last = [None]
+
+        def push(node, kind):
+            if (node, kind) not in trie:
+                trie[(node, kind)] = len(parent)
+                parent.append(node)
+                last.append(kind)
+            return trie[(node, kind)]
+
+        def step(node, b, direction):
+            if node == -1 or b is None:
+                return node
+            kind, d = b
+            if d == direction:
+                return push(node, kind)
+            if node == 0 or last[node] != kind:
+                return -1
+            return parent[node]
+
+        self.forward = [0] * (n + 1)
+        for i, b in enumerate(brackets):
+            self.forward[i + 1] = step(self.forward[i], b, 1)
+        self.backward = [0] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            self.backward[i] = step(self.backward[i + 1], brackets[i], -1)
+
+    def balanced(self, l: int, r: int) -> bool:
+        """
+        checkBalance(tokens[l:r])
+        """
+        return self.mode == 'none' or (self.depth[r] == self.depth[l] and r <= self.limit[l])
+
+    def balancedWithout(self, l: int, r: int) -> bool:
+        """
+        checkBalance(tokens[:l] + tokens[r:])
+        """
+        return self.mode == 'none' or self.forward[l] == self.backward[r] != -1
+
+    def balancedSpanArrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        all non-empty balanced spans as arrays of l and r, ordered by l then r
+        """
+        n = self.n
+        if self.mode == 'none':
+            return np.triu_indices(n + 1, 1)
+        depth = np.asarray(self.depth, dtype=np.int64)
+        limit = np.asarray(self.limit, dtype=np.int64)
+        # positions grouped by depth, a balanced span [l, r) has r in the group of l, after l and up to limit[l]
+        keys = (depth - depth.min()) * (n + 2) + np.arange(n + 1)
+        order = np.argsort(keys, kind='stable')
+        rank = np.empty(n + 1, dtype=np.int64)
+        rank[order] = np.arange(n + 1)
+        start = rank[:n] + 1
+        end = np.searchsorted(keys[order], keys[:n] - np.arange(n) + limit[:n], side='right')
+        counts = np.maximum(end - start, 0)
+        ls = np.repeat(np.arange(n), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rs = order[np.repeat(start, counts) + offsets]
+        return ls, rs
+
+    def balancedSpans(self) -> List[Tuple[int, int]]:
+        """
+        all non-empty balanced spans (l, r)
+        """
+        ls, rs = self.balancedSpanArrays()
+        return list(zip(ls.tolist(), rs.tolist()))
+
+
+def balance_index(tokens: Tokens, table=None) -> BalanceIndex:
+    """
+    the index of an example, cached per interned example and balance mode
+    the cache lives in the example table (the current one by default), and is freed with it
+    """
+    from crucio.tokenize.span import example_table
+    table = example_table() if table is None else table
+    key = (table.intern(tokens), balance_mode())
+    if key not in table.balance:
+        table.balance[key] = BalanceIndex(table.examples[key[0]], key[1])
+    return table.balance[key]
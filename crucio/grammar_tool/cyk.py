@@ -0,0 +1,231 @@
+"""
+Bit-parallel CYK over token type codes. The grammar is binarised once, every cell of the chart is a uint64 bitset
+of nonterminals, and all sentences of one length are recognized together with numpy.
+Accepts the same sentences as Grammar.getOracle().
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from crucio.data_types import Grammar, Prod
+from crucio.utils.statistics import counting, timer
+
+WORD = np.uint64
+BITS = 64
+
+
+class BitRules:
+    def __init__(self, sources: List[Tuple[int, ...]], targets: List[int], n_words: int):
+        """
+        rules setting bit targets[r] when every bit of sources[r] is set, sorted by target word
+        so that one reduceat per word ORs them together
+        """
+        order = sorted(range(len(targets)), key=lambda r: targets[r])
+        self.n = len(order)
+        self.n_words = n_words
+        arity = len(sources[0]) if sources else 0
+        self.words = [np.array([sources[r][a] // BITS for r in order], dtype=np.int64) for a in range(arity)]
+        self.shifts = [np.array([sources[r][a] % BITS for r in order], dtype=WORD) for a in range(arity)]
+        target = np.array([targets[r] for r in order], dtype=np.int64)
+        self.target_shifts = (target % BITS).astype(WORD)
+        target_words = target // BITS
+        self.offsets = np.flatnonzero(np.r_[True, target_words[1:] != target_words[:-1]]) if self.n else target_words
+        self.target_words = target_words[self.offsets]
+
+    def apply(self, *cells: np.ndarray) -> np.ndarray:
+        """
+        :param cells: one (P, n_words) bitset array per source
+        :return: (P, n_words) bitsets of the targets
+        """
+        out = np.zeros((cells[0].shape[0], self.n_words), dtype=WORD)
+        if self.n == 0:
+            return out
+        hits = None
+        for cell, words, shifts in zip(cells, self.words, self.shifts):
+            bit = (cell[:, words] >> shifts) & WORD(1)
+            hits = bit if hits is None else hits & bit
+        out[:, self.target_words] = np.bitwise_or.reduceat(hits << self.target_shifts, self.offsets, axis=1)
+        return out
+
+
+class CYKRecognizer:
+    @timer('CYKRecognizer build')
+    def __init__(self, start, prods: Iterable[Prod]):
+        """
+        :param prods: productions over nonterminal names and Token terminals, empty bodies allowed
+        """
+        self.nts: Dict[object, int] = {}
+        binary: List[Tuple[int, int, int]] = []
+        units: Set[Tuple[int, int]] = set()
+        empty: Set[int] = set()
+        by_code: Dict[int, Set[int]] = defaultdict(set)
+        helpers: Dict[int, int] = {}
+
+        def terminal_nt(code: int) -> int:
+            # a fresh nonterminal deriving only this terminal, for terminals inside longer bodies
+            if code not in helpers:
+                helpers[code] = self.__fresh()
+                by_code[code].add(helpers[code])
+            return helpers[code]
+
+        for prod in prods:
+            a = self.__nt(prod.getNt())
+            if len(prod) == 0:
+                empty.add(a)
+            elif len(prod) == 1:
+                symbol = prod[0]
+                if symbol.isTerminal():
+                    by_code[symbol.getValue().code].add(a)
+                else:
+                    units.add((a, self.__nt(symbol.getValue())))
+            else:
+                body = [terminal_nt(symbol.getValue().code) if symbol.isTerminal() else self.__nt(symbol.getValue())
+                        for symbol in prod]
+                # a -> x1 x2 ... xk as a -> x1 h1, h1 -> x2 h2, ..., h(k-2) -> x(k-1) xk
+                left = a
+                for x in body[:-2]:
+                    rest = self.__fresh()
+                    binary.append((left, x, rest))
+                    left = rest
+                binary.append((left, body[-2], body[-1]))
+        self.start = self.nts.get(start)
+        nullable = set(empty)
+        changed = True
+        while changed:
+            changed = False
+            for a, b, c in binary:
+                if a not in nullable and b in nullable and c in nullable:
+                    nullable.add(a)
+                    changed = True
+            for a, b in units:
+                if a not in nullable and b in nullable:
+                    nullable.add(a)
+                    changed = True
+        self.startNullable = self.start in nullable
+        # a nullable side of a binary rule turns it into a unit rule for nonempty spans
+        for a, b, c in binary:
+            if c in nullable:
+                units.add((a, b))
+            if b in nullable:
+                units.add((a, c))
+        # parents[b]: every a with a =>* b through unit rules
+        direct = defaultdict(set)
+        for a, b in units:
+            if a != b:
+                direct[b].add(a)
+        closure_sources = []
+        closure_targets = []
+        for b in range(len(self.nts)):
+            parents = set()
+            stack = list(direct[b])
+            while stack:
+                a = stack.pop()
+                if a in parents or a == b:
+                    continue
+                parents.add(a)
+                stack.extend(direct[a])
+            for a in parents:
+                closure_sources.append((b,))
+                closure_targets.append(a)
+        self.n_words = max((len(self.nts) + BITS - 1) // BITS, 1)
+        self.binary = BitRules([(b, c) for _, b, c in binary], [a for a, _, _ in binary], self.n_words)
+        self.closure = BitRules(closure_sources, closure_targets, self.n_words)
+        # row 0 is the empty bitset of codes not in the grammar
+        self.codes = {code: i + 1 for i, code in enumerate(by_code)}
+        table = np.zeros((len(self.codes) + 1, self.n_words), dtype=WORD)
+        for code, row in self.codes.items():
+            for a in by_code[code]:
+                table[row, a // BITS] |= WORD(1) << WORD(a % BITS)
+        self.table = table | self.closure.apply(table)
+
+    @staticmethod
+    def fromGrammar(grammar: Grammar) -> "CYKRecognizer":
+        prods = list(grammar.getProds())
+        # asLark writes a rule without productions as `nt: `, which derives the empty sentence
+        prods.extend(Prod(rule.getNt(), ()) for rule in grammar.getRules() if len(rule) == 0)
+        return CYKRecognizer(grammar.getStart(), prods)
+
+    def __nt(self, nt) -> int:
+        if nt not in self.nts:
+            self.nts[nt] = len(self.nts)
+        return self.nts[nt]
+
+    def __fresh(self) -> int:
+        return self.__nt(('cyk helper', len(self.nts)))
+
+    def __recognize_length(self, rows: np.ndarray) -> np.ndarray:
+        """
+        :param rows: (S, n) rows of `table` for S sentences of length n >= 1
+        """
+        n_sentences, n = rows.shape
+        cells = [None, self.table[rows]]
+        for length in range(2, n + 1):
+            m = n - length + 1
+            acc = np.zeros((n_sentences * m, self.n_words), dtype=WORD)
+            for k in range(1, length):
+                left = cells[k][:, :m]
+                right = cells[length - k][:, k:k + m]
+                if not left.any() or not right.any():
+                    continue
+                acc |= self.binary.apply(left.reshape(-1, self.n_words), right.reshape(-1, self.n_words))
+            acc |= self.closure.apply(acc)
+            cells.append(acc.reshape(n_sentences, m, self.n_words))
+        top = cells[n][:, 0]
+        return ((top[:, self.start // BITS] >> WORD(self.start % BITS)) & WORD(1)).astype(np.bool_)
+
+    def recognize_many(self, sentences: Sequence[Sequence[int]]) -> np.ndarray:
+        """
+        :param sentences: token type codes of each sentence
+        :return: a boolean vector, sentences of the same length are recognized in one pass
+        """
+        ans = np.zeros(len(sentences), dtype=np.bool_)
+        if self.start is None:
+            return ans
+        by_length = defaultdict(list)
+        for k, sentence in enumerate(sentences):
+            by_length[len(sentence)].append(k)
+        for length, indexes in by_length.items():
+            counting('CYKRecognizer sentences', len(indexes))
+            if length == 0:
+                ans[indexes] = self.startNullable
+                continue
+            rows = np.array([[self.codes.get(code, 0) for code in sentences[k]] for k in indexes], dtype=np.int64)
+            ans[indexes] = self.__recognize_length(rows)
+        return ans
+
+    def recognize(self, codes: Sequence[int]) -> bool:
+        return bool(self.recognize_many([codes])[0])
+
+
+if __name__ == '__main__':
+    # python -m crucio.grammar_tool.cyk: throughput against the Lark oracle and the Earley recognizer
+    import random
+    import time
+    from crucio.grammar_tool.earley import EarleyRecognizer, random_grammar
+
+    random.seed(0)
+    for n_nts, n_prods, length in [(5, 20, 6), (20, 80, 8), (40, 160, 12)]:
+        grammar = random_grammar(n_nts, 6, n_prods)
+        terminals = sorted(grammar.getCharset(), key=str)
+        sentences = [tuple(random.choice(terminals) for _ in range(random.randint(0, length))) for _ in range(2000)]
+        codes = [[token.code for token in sentence] for sentence in sentences]
+        start = time.time()
+        cyk = CYKRecognizer.fromGrammar(grammar)
+        build = time.time() - start
+        start = time.time()
+        answers = cyk.recognize_many(codes)
+        batch = time.time() - start
+        start = time.time()
+        earley = EarleyRecognizer.fromGrammar(grammar)
+        expected = [earley.recognize(sentence) for sentence in codes]
+        earley_time = time.time() - start
+        assert answers.tolist() == expected
+        # lark is slow on ambiguous grammars, only a sample
+        sample = sentences[:100]
+        start = time.time()
+        lark_oracle = grammar.getOracle()
+        assert [lark_oracle.parse(sentence) for sentence in sample] == expected[:100]
+        lark_time = (time.time() - start) * len(sentences) / len(sample)
+        print(f'{n_nts} nts {n_prods} prods {int(answers.sum())}/{len(sentences)} accepted: '
+              f'cyk build {build:.4f}s batch {batch:.3f}s, earley {earley_time:.3f}s, lark ~{lark_time:.1f}s')
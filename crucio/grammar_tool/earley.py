@@ -0,0 +1,307 @@
+"""
+Earley recognizer over token type codes. Productions are added and removed in place, no grammar is compiled,
+so an oracle for a growing grammar costs nothing to rebuild. Accepts the same sentences as Grammar.getOracle().
+"""
+import random
+from typing import Collection, Dict, List, Optional, Sequence, Set, Tuple
+
+from crucio.data_types import Grammar, Prod, Symbol
+from crucio.grammar_tool.cyk import CYKRecognizer
+from crucio.oracle import TokenOracle, ExtendOracle
+from crucio.tokenize import Token, Tokens
+from crucio.utils.statistics import counter, timer
+
+# (production, dot, origin)
+Item = Tuple[int, int, int]
+
+
+class ChartSet:
+    __slots__ = ('items', 'seen', 'waiting', 'scanning', 'accepted')
+
+    def __init__(self):
+        """
+        the Earley items ending at one position, indexed by the symbol after the dot
+        """
+        self.items: List[Item] = []
+        self.seen: Set[Item] = set()
+        # nonterminal -> items expecting it, token code -> items expecting it
+        self.waiting: Dict[int, List[Item]] = {}
+        self.scanning: Dict[int, List[Item]] = {}
+        self.accepted = False
+
+
+class EarleyRecognizer:
+    def __init__(self, start):
+        """
+        Terminals are encoded as their token type code, nonterminal k as ~k (negative).
+        """
+        self.start = start
+        self.nts: Dict[object, int] = {}
+        self.lhs: List[int] = []
+        self.rhs: List[Optional[Tuple[int, ...]]] = []
+        self.index: Dict[Prod, int] = {}
+        self.free: List[int] = []
+        self.byNt: Dict[int, List[int]] = {}
+        self.version = 0
+        self.__nullable: Optional[Set[int]] = None
+        # chart of the last recognized sentence, reused for a common prefix
+        self.__codes: List[int] = []
+        self.__chart: List[ChartSet] = []
+
+    @staticmethod
+    @timer('EarleyRecognizer build')
+    def fromGrammar(grammar: Grammar) -> "EarleyRecognizer":
+        recognizer = EarleyRecognizer(grammar.getStart())
+        for rule in grammar.getRules():
+            # asLark writes a rule without productions as `nt: `, which derives the empty sentence
+            if len(rule) == 0:
+                recognizer.addProd(Prod(rule.getNt(), ()))
+            for prod in rule.getProds():
+                recognizer.addProd(prod)
+        return recognizer
+
+    def __nt(self, nt) -> int:
+        if nt not in self.nts:
+            self.nts[nt] = len(self.nts)
+        return self.nts[nt]
+
+    def __changed(self):
+        self.version += 1
+        self.__nullable = None
+        self.__codes = []
+        self.__chart = []
+
+    def addProd(self, prod: Prod):
+        if prod in self.index:
+            return
+        rhs = tuple(symbol.getValue().code if symbol.isTerminal() else ~self.__nt(symbol.getValue())
+                    for symbol in prod)
+        if self.free:
+            p = self.free.pop()
+            self.lhs[p] = self.__nt(prod.getNt())
+            self.rhs[p] = rhs
+        else:
+            p = len(self.rhs)
+            self.lhs.append(self.__nt(prod.getNt()))
+            self.rhs.append(rhs)
+        self.index[prod] = p
+        self.byNt.setdefault(self.lhs[p], []).append(p)
+        self.__changed()
+
+    def removeProd(self, prod: Prod):
+        p = self.index.pop(prod, None)
+        if p is None:
+            return
+        self.byNt[self.lhs[p]].remove(p)
+        self.rhs[p] = None
+        self.free.append(p)
+        self.__changed()
+
+    def getProds(self) -> List[Prod]:
+        return list(self.index)
+
+    def nullable(self) -> Set[int]:
+        """
+        nonterminals deriving the empty sentence
+        """
+        if self.__nullable is None:
+            nullable = set()
+            changed = True
+            while changed:
+                changed = False
+                for nt, prods in self.byNt.items():
+                    if nt in nullable:
+                        continue
+                    if any(all(s < 0 and ~s in nullable for s in self.rhs[p]) for p in prods):
+                        nullable.add(nt)
+                        changed = True
+            self.__nullable = nullable
+        return self.__nullable
+
+    def __add(self, chart: ChartSet, item: Item):
+        if item in chart.seen:
+            return
+        chart.seen.add(item)
+        chart.items.append(item)
+
+    def __close(self, chart: List[ChartSet], i: int):
+        """
+        predict and complete set i until nothing changes
+        """
+        current = chart[i]
+        nullable = self.nullable()
+        start = self.nts.get(self.start)
+        j = 0
+        while j < len(current.items):
+            item = current.items[j]
+            j += 1
+            p, dot, origin = item
+            rhs = self.rhs[p]
+            if dot < len(rhs):
+                symbol = rhs[dot]
+                if symbol >= 0:
+                    current.scanning.setdefault(symbol, []).append(item)
+                    continue
+                nt = ~symbol
+                current.waiting.setdefault(nt, []).append(item)
+                for q in self.byNt.get(nt, ()):
+                    self.__add(current, (q, 0, i))
+                # Aycock-Horspool: a nullable nonterminal is completed as soon as it is predicted
+                if nt in nullable:
+                    self.__add(current, (p, dot + 1, origin))
+                continue
+            lhs = self.lhs[p]
+            if lhs == start and origin == 0:
+                current.accepted = True
+            # completions with origin i are covered by the nullable rule above
+            if origin < i:
+                for waiting in chart[origin].waiting.get(lhs, ()):
+                    self.__add(current, (waiting[0], waiting[1] + 1, waiting[2]))
+
+    def __initial(self) -> ChartSet:
+        chart = ChartSet()
+        start = self.nts.get(self.start)
+        for p in self.byNt.get(start, ()):
+            self.__add(chart, (p, 0, 0))
+        return chart
+
+    def __scan(self, previous: ChartSet, code: int) -> ChartSet:
+        chart = ChartSet()
+        for p, dot, origin in previous.scanning.get(code, ()):
+            self.__add(chart, (p, dot + 1, origin))
+        return chart
+
+    @counter('EarleyRecognizer')
+    def recognize(self, codes: Sequence[int]) -> bool:
+        """
+        :param codes: token type codes of the sentence
+        """
+        codes = list(codes)
+        chart = self.__chart
+        # sets up to the common prefix with the last sentence are still valid
+        shared = 0
+        limit = min(len(codes), len(self.__codes), len(chart) - 1)
+        while shared < limit and codes[shared] == self.__codes[shared]:
+            shared += 1
+        del chart[shared + 1:]
+        if len(chart) == 0:
+            chart.append(self.__initial())
+            self.__close(chart, 0)
+        for i in range(shared, len(codes)):
+            if len(chart[i].items) == 0:
+                break
+            chart.append(self.__scan(chart[i], codes[i]))
+            self.__close(chart, i + 1)
+        self.__codes = codes
+        return len(chart) == len(codes) + 1 and chart[-1].accepted
+
+    def __getstate__(self):
+        # the chart of the last sentence is only a cache, it is not sent to coverage workers
+        state = self.__dict__.copy()
+        state['_EarleyRecognizer__codes'] = []
+        state['_EarleyRecognizer__chart'] = []
+        return state
+
+    def recognize_many(self, sentences: Sequence[Sequence[int]]) -> List[bool]:
+        """
+        recognize in lexicographic order so that consecutive sentences share the sets of their common prefix
+        """
+        order = sorted(range(len(sentences)), key=lambda k: tuple(sentences[k]))
+        ans = [False] * len(sentences)
+        for k in order:
+            ans[k] = self.recognize(sentences[k])
+        return ans
+
+
+class RecognizerOracle(TokenOracle, ExtendOracle):
+    def __init__(self, recognizer: EarleyRecognizer):
+        """
+        token oracle of a grammar, follows the productions added to or removed from `recognizer`.
+        Batches go through a CYKRecognizer rebuilt whenever the productions changed.
+        """
+        self.recognizer = recognizer
+        self.__cyk: Optional[CYKRecognizer] = None
+        self.__cykVersion = -1
+
+    @counter('RecognizerOracle')
+    @timer('RecognizerOracle')
+    def parse(self, tokens: Tokens) -> bool:
+        return self.recognizer.recognize([token.code for token in tokens])
+
+    @timer('RecognizerOracle batch')
+    def batch(self, items: Collection[Tokens], desc='ParseBatch') -> Dict[Tokens, bool]:
+        if self.__cykVersion != self.recognizer.version:
+            self.__cyk = CYKRecognizer(self.recognizer.start, self.recognizer.getProds())
+            self.__cykVersion = self.recognizer.version
+        items = list(items)
+        answers = self.__cyk.recognize_many([[token.code for token in tokens] for tokens in items])
+        return dict(zip(items, answers.tolist()))
+
+
+def random_grammar(n_nts: int, n_terminals: int, n_prods: int) -> Grammar:
+    """
+    random grammar over T0..T{n_terminals-1}, every nonterminal has a terminal production
+    used by the benchmarks of this module and cyk
+    """
+    grammar = Grammar('n0', [])
+    nts = [f'n{i}' for i in range(n_nts)]
+    terminals = [Token(f'T{i}') for i in range(n_terminals)]
+    for nt in nts:
+        grammar.addProd(Prod(nt, (Symbol(random.choice(terminals)),)))
+    for _ in range(n_prods):
+        body = [Symbol(random.choice(terminals)) if random.random() < 0.5 else Symbol(random.choice(nts))
+                for _ in range(random.randint(0, 4))]
+        grammar.addProd(Prod(random.choice(nts), tuple(body)))
+    return grammar
+
+
+if __name__ == '__main__':
+    # python -m crucio.grammar_tool.earley: construction and recognition against the Lark oracle
+    import time
+
+    def generate(grammar: Grammar, nt, depth: int) -> Tokens:
+        prods = grammar.getProds(nt)
+        if depth <= 0:
+            prods = [min(prods, key=lambda x: sum(not symbol.isTerminal() for symbol in x))]
+        ans = ()
+        for symbol in random.choice(prods):
+            ans += (symbol.getValue(),) if symbol.isTerminal() else generate(grammar, symbol.getValue(), depth - 1)
+        return ans
+
+    def mutate(tokens: Tokens, terminals: List[Token]) -> Tokens:
+        tokens = list(tokens)
+        i = random.randint(0, len(tokens))
+        if tokens and random.random() < 0.5:
+            del tokens[min(i, len(tokens) - 1)]
+        else:
+            tokens.insert(i, random.choice(terminals))
+        return tuple(tokens)
+
+    random.seed(0)
+    for n_nts, n_prods in [(5, 20), (20, 80), (30, 120)]:
+        grammar = random_grammar(n_nts, 8, n_prods)
+        terminals = sorted(grammar.getCharset(), key=str)
+        sentences = []
+        for _ in range(300):
+            sentence = generate(grammar, 'n0', 6)
+            sentences.append(sentence)
+            sentences.append(mutate(sentence, terminals))
+        start = time.time()
+        lark_oracle = grammar.getOracle()
+        lark_build = time.time() - start
+        start = time.time()
+        expected = [lark_oracle.parse(sentence) for sentence in sentences]
+        lark_parse = time.time() - start
+        start = time.time()
+        oracle = RecognizerOracle(EarleyRecognizer.fromGrammar(grammar))
+        native_build = time.time() - start
+        start = time.time()
+        answers = [oracle.parse(sentence) for sentence in sentences]
+        native_parse = time.time() - start
+        start = time.time()
+        batched = oracle.recognizer.recognize_many([[token.code for token in sentence] for sentence in sentences])
+        native_batch = time.time() - start
+        assert answers == expected and batched == expected
+        print(f'{n_nts} nts {n_prods} prods {sum(expected)}/{len(sentences)} accepted: '
+              f'lark build {lark_build:.4f}s parse {lark_parse:.3f}s, '
+              f'native build {native_build:.4f}s parse {native_parse:.3f}s batch {native_batch:.3f}s')
@@ -1,11 +1,12 @@
 from crucio.config import Config
 from crucio.utils.sub_con import Subs, Cons, SubsK, ConsK
-from crucio.data_types.distribution.matrix import DistributionalMatrix
+from crucio.data_types.distribution.matrix import DistributionalMatrix, LazyDistributionalMatrix
 from crucio.utils.log import Logger, terminal
-from crucio.utils.statistics import timer
+from crucio.utils.statistics import timer, phase
 
 
 @timer('buildDM')
+@phase('DM build')
 def build_dm(examples, oracle, logger:Logger = terminal):
     if Config.localConSub == 0:
         subs = Subs(examples)
@@ -14,4 +15,6 @@ def build_dm(examples, oracle, logger:Logger = terminal):
         subs = SubsK(examples, Config.localConSub)
         cons = ConsK(examples, Config.localConSub)
     logger.print('Sub=',len(subs),'Con=',len(cons),'Total=',len(subs)*len(cons))
+    if Config.lazyDM:
+        return LazyDistributionalMatrix(subs, cons, oracle, logger)
     return DistributionalMatrix(subs, cons, oracle,logger)
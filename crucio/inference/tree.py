@@ -1,4 +1,4 @@
-from collections import defaultdict
+from collections import defaultdict, Counter
 from dataclasses import dataclass
 from typing import List, Union, Optional
 
@@ -6,7 +6,11 @@ from colored import bg, attr
 
 from crucio.data_types import Prod, Symbol, Grammar
 from crucio.data_types.interval_example import IntervalExample
+from crucio.config import Config
+from crucio.grammar_tool.earley import EarleyRecognizer, RecognizerOracle
+from crucio.oracle import TokenOracle
 from crucio.tokenize import Token, Tokens, TokenizedContext
+from crucio.tokenize.span import Span, SpanContext
 from crucio.utils.statistics import timer
 
 
@@ -22,14 +26,24 @@ class Node:
     lm = None
     rm = None
 
-    def getProds(self):
+    def getProd(self):
+        """
+        只包含这一层的产生式, 叶子节点为None
+        """
         if self.child is None:
-            return []
+            return None
+        return Prod(self.value, tuple(Symbol(child.value) for child in self.children()))
+
+    def getProds(self):
+        # 先序遍历, 用栈代替递归
         ans = []
-        nt = self.value
-        ans.append(Prod(nt, tuple(Symbol(child.value) for child in self.children())))
-        for child in self.children():
-            ans.extend(child.getProds())
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.child is None:
+                continue
+            ans.append(node.getProd())
+            stack.extend(reversed(list(node.children())))
         return ans
 
     def getContext(self):
@@ -88,7 +102,7 @@ class Node:
             return ()
         leftmost = self.leftmost()
         rightmost = self.rightmost()
-        return leftmost.example[leftmost.index:rightmost.index + 1]
+        return Span.of(leftmost.example, leftmost.index, rightmost.index + 1)
 
     def bubbling(self):
         if self.child is None:
@@ -289,15 +303,12 @@ class Bubble:
     def getSeq(self):
         leftmost = self.start.leftmost()
         rightmost = self.end.rightmost()
-        return leftmost.example[leftmost.index:rightmost.index + 1]
+        return Span.of(leftmost.example, leftmost.index, rightmost.index + 1)
     @timer('getContext')
     def getContext(self):
         leftmost = self.start.leftmost()
         rightmost = self.end.rightmost()
-        example = leftmost.example
-        prefix = example[:leftmost.index]
-        suffix = example[rightmost.index + 1:]
-        return TokenizedContext(prefix, suffix)
+        return SpanContext.of(leftmost.example, leftmost.index, rightmost.index + 1)
 
     @timer('getIE')
     def getIE(self):
@@ -356,6 +367,70 @@ def buildGrammar(forest: List[Node], start='n0'):
             g.addProd(prod)
     return g
 
+
+class ForestGrammar(Grammar):
+    def __init__(self, forest: List[Node], start='n0'):
+        """
+        与 buildGrammar(forest) 产生式相同的语法, 记录每个产生式对应的节点数.
+        折叠bubble时只增删受影响的产生式, 语法对象原地更新
+        """
+        super().__init__(start, [])
+        self.__counts: Counter = Counter()
+        # 与产生式同步增删, 不需要重新编译
+        self.recognizer = EarleyRecognizer(start)
+        # 每次增删产生式加一, 用于判断oracle是否需要重建
+        self.version = 0
+        self.__oracle = None
+        self.__oracleVersion = -1
+        for tree in forest:
+            for prod in tree.getProds():
+                self.__add(prod)
+
+    def __add(self, prod: Prod):
+        self.__counts[prod] += 1
+        if self.__counts[prod] == 1:
+            Grammar.addProd(self, prod)
+            self.recognizer.addProd(prod)
+            self.version += 1
+
+    def __remove(self, prod: Prod):
+        self.__counts[prod] -= 1
+        if self.__counts[prod] > 0:
+            return
+        del self.__counts[prod]
+        Grammar.removeProd(self, prod)
+        self.recognizer.removeProd(prod)
+        if len(self.getRule(prod.getNt())) == 0 and prod.getNt() != self.getStart():
+            self.removeRule(prod.getNt())
+        self.version += 1
+
+    def count(self, prod: Prod) -> int:
+        return self.__counts[prod]
+
+    @timer('ForestGrammar fold')
+    def fold(self, bubble: "Bubble", nt) -> Node:
+        """
+        Bubble.fold, 只有父节点的产生式改变, 并新增新节点的产生式
+        """
+        parent = bubble.parent
+        self.__remove(parent.getProd())
+        node = bubble.fold(nt)
+        self.__add(parent.getProd())
+        self.__add(node.getProd())
+        return node
+
+    def getOracle(self) -> TokenOracle:
+        if Config.nativeRecognizer:
+            if self.__oracle is None:
+                self.__oracle = RecognizerOracle(self.recognizer)
+            return self.__oracle
+        # 语法没有变化时复用之前的oracle
+        if self.__oracleVersion != self.version:
+            self.__oracle = super().getOracle()
+            self.__oracleVersion = self.version
+        return self.__oracle
+
+
 def getNtDict(trees):
     ntDict = defaultdict(list)
     def visit(tree:Node):
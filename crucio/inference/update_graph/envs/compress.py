@@ -1,104 +1,160 @@
 """
 压缩分布矩阵
 """
-from typing import Collection, FrozenSet, Dict, Set
+import itertools
+from typing import Collection, FrozenSet, Dict, List, Optional, Tuple
 
 import numpy as np
 
-from crucio.data_types.distribution.matrix import DistributionalMatrix
+from crucio.data_types.distribution.bitmatrix import BitMatrix
+from crucio.data_types.distribution.matrix import DistributionalMatrix, LazyDistributionalMatrix
+
+
+def group_indexes(groups: Collection[Collection[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把若干组下标展平, 配合 reduceat 使用
+    :return: 展平的下标, 每组在其中的起始位置
+    """
+    sizes = np.fromiter((len(group) for group in groups), dtype=np.int64, count=len(groups))
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64) if len(groups) > 0 \
+        else np.zeros(0, dtype=np.int64)
+    flat = np.fromiter(itertools.chain.from_iterable(groups), dtype=np.int64, count=int(sizes.sum()))
+    return flat, offsets
 
 
 class CompressedDM:
     def __init__(self, dm: DistributionalMatrix):
-        self.__mat = np.copy(dm.getMatrix())
+        """
+        压缩矩阵及其已知单元掩码都按位存储, 不解压原始矩阵
+        """
+        self.__mat = dm.getBitMatrix().copy()
+        # 惰性矩阵的未知单元值为1, 压缩时: 有已知的0则结果已知为0, 全部已知则结果已知. None 表示全部已知
+        known = dm.getKnownBits()
+        self.__known = None if known is None else known.copy()
+        self.__dm = dm
         self.__cons = [{i} for i in dm.getContexts()]
         self.__subs = [{i} for i in dm.getSubseqs()]
 
     def update_dm(self, dm: DistributionalMatrix):
         rows_map = {}
         cols_map = {}
+        # 只需判断单元素组, 用集合代替在列表中查找 {x}
+        single_subs = {next(iter(i)) for i in self.__subs if len(i) == 1}
+        single_cons = {next(iter(i)) for i in self.__cons if len(i) == 1}
         # 更新subs
-        m = 0
-        for i in range(len(dm.getSubseqs())):
-            if {dm.getSubseqs()[i]} not in self.__subs:
-                self.__subs.append({dm.getSubseqs()[i]})
-                m += 1
+        new_subs = [{i} for i in dm.getSubseqs() if i not in single_subs]
+        self.__subs.extend(new_subs)
+        m = len(new_subs)
         # 更新cons
-        n = 0
-        for i in range(len(dm.getContexts())):
-            if {dm.getContexts()[i]} not in self.__cons:
-                self.__cons.append({dm.getContexts()[i]})
-                n += 1
-
-        # 更新__mat
-        B = np.pad(self.__mat, pad_width=((0, m), (0, n)), mode='constant', constant_values=0)
-        for i in range(len(self.__subs)-m,len(self.__subs)):
-            for j in range(len(self.__cons)):
-                B[i,j] = all(dm.getMatrix()[dm.getIndexBySubseq(sub),dm.getIndexByContext(con)]
-                             for sub in self.__subs[i] for con in self.__cons[j])
-        for j in range(len(self.__cons)-n,len(self.__cons)):
-            for i in range(len(self.__subs)):
-                B[i,j] = all(dm.getMatrix()[dm.getIndexBySubseq(sub),dm.getIndexByContext(con)]
-                             for sub in self.__subs[i] for con in self.__cons[j])
-        self.__mat = B
+        new_cons = [{i} for i in dm.getContexts() if i not in single_cons]
+        self.__cons.extend(new_cons)
+        n = len(new_cons)
+        rows, cols = self.__mat.shape
+
+        # 惰性矩阵: 新的行列先标记为未知, 读取时再计算
+        if self.__known is not None:
+            for _ in range(n):
+                self.__mat.addColumn(np.ones(rows, dtype=np.uint8))
+                self.__known.addColumn()
+            for _ in range(m):
+                self.__mat.addRow(np.ones(cols + n, dtype=np.uint8))
+                self.__known.addRow()
+            return rows_map, cols_map
+        bm = dm.getBitMatrix()
+        sub_flat, sub_offsets = group_indexes([[dm.getIndexBySubseq(sub) for sub in subs] for subs in self.__subs])
+        con_flat, con_offsets = group_indexes([[dm.getIndexByContext(con) for con in cons] for cons in self.__cons])
+        # 新列: 对其包含的con所在列取与, 再检查每组sub是否全为1
+        if n > 0:
+            begin = con_offsets[len(self.__cons) - n]
+            columns = np.bitwise_and.reduceat(bm.columns(con_flat[begin:]), con_offsets[-n:] - begin, axis=1)
+            columns = np.logical_and.reduceat(columns[sub_flat], sub_offsets, axis=0)
+            for k in range(n):
+                self.__mat.addColumn(columns[:rows, k])
+        # 新行: 先对其包含的sub所在行按位与, 再检查每组con是否全为1
+        if m > 0:
+            begin = sub_offsets[len(self.__subs) - m]
+            new_rows = np.bitwise_and.reduceat(bm.rows(sub_flat[begin:]), sub_offsets[-m:] - begin, axis=0)
+            new_rows = np.logical_and.reduceat(new_rows[:, con_flat], con_offsets, axis=1)
+            for row in new_rows:
+                self.__mat.addRow(row)
         assert self.__mat.shape[0] == len(self.subs)
         assert self.__mat.shape[1] == len(self.cons)
         return rows_map,cols_map
+
     @property
-    def mat(self):
+    def mat(self) -> BitMatrix:
         return self.__mat
 
+    @property
+    def known(self) -> Optional[BitMatrix]:
+        return self.__known
+
+    def block(self, rows, cols) -> np.ndarray:
+        """
+        解压 rows x cols 的子矩阵
+        """
+        return self.__mat.block(rows, cols)
+
+    def known_block(self, rows, cols) -> np.ndarray:
+        """
+        rows x cols 的子矩阵中已知的单元
+        """
+        if self.__known is None:
+            return np.ones((len(rows), len(cols)), dtype=np.bool_)
+        return self.__known.block(rows, cols).astype(np.bool_)
+
+    def resolve(self, rows, cols):
+        """
+        计算压缩矩阵中的未知单元, 所需的原始单元一次性批量查询
+        :param rows: 压缩矩阵的行下标
+        :param cols: 对应的列下标
+        """
+        if self.__known is None:
+            return
+        cells = {(int(i), int(j)) for i, j in zip(rows, cols) if not self.__known[i, j]}
+        if len(cells) == 0:
+            return
+        dm = self.__dm
+        underlying = {}
+        needed = set()
+        for i, j in cells:
+            block = list(itertools.product([dm.getIndexBySubseq(sub) for sub in self.__subs[i]],
+                                           [dm.getIndexByContext(con) for con in self.__cons[j]]))
+            # 已知的0直接决定结果
+            if any(dm.isKnown(r, c) and dm.peek(r, c) == 0 for r, c in block):
+                self.__mat[i, j] = 0
+                self.__known[i, j] = 1
+                continue
+            underlying[(i, j)] = block
+            needed.update(block)
+        dm.prefetch(needed)
+        for (i, j), block in underlying.items():
+            self.__mat[i, j] = all(dm.peek(r, c) for r, c in block)
+            self.__known[i, j] = 1
+
     def __getitem__(self, item):
         return self.__mat[item]
 
-    def __compress_rows(self, rows) -> int:
-        rows = list(rows)
-        if len(rows) == 1:
-            return rows[0]
-
-        # 遍历self.__mat所有的row,进行and操作
-        new_row = np.bitwise_and.reduce(self.__mat[rows], axis=0)
-
-        # 添加一个新row到self.__mat
-        self.__mat = np.vstack([self.__mat, new_row])
-        return self.__mat.shape[0] - 1
-
-    def __compress_cols(self, cols) -> int:
-        cols = list(cols)
-        if len(cols) == 1:
-            return cols[0]
-
-        # 遍历self.__mat所有的col,进行and操作
-        new_col = np.bitwise_and.reduce(self.__mat[:, cols], axis=1)
-
-        # 添加一个新col到self.__mat
-        self.__mat = np.hstack([self.__mat, new_col[:, np.newaxis]])
-        return self.__mat.shape[1] - 1
-
-    def __trim_matrix(self, rows_map, cols_map):
-        valid_rows, valid_cols = rows_map.values(), cols_map.values()
-        m, n = self.__mat.shape
-        invalid_rows: Set[int]
-        invalid_cols: Set[int]
-        invalid_rows, invalid_cols = set(range(m)).difference(valid_rows), set(range(n)).difference(valid_cols)
-        # 删除无效的行
-        for row in sorted(invalid_rows, reverse=True):  # 倒序删除避免索引错乱
-            # 删除row
-            self.__mat = np.delete(self.__mat, row, axis=0)
-
-            # 更新rows_map中所有大于row的index减1
-            for key in rows_map:
-                if rows_map[key] > row:
-                    rows_map[key] -= 1
-        # 删除无效的列
-        for col in sorted(invalid_cols, reverse=True):  # 同样倒序删除
-            # 删除col
-            self.__mat = np.delete(self.__mat, col, axis=1)
-
-            # 更新cols_map中所有大于col的index减1
-            for key in cols_map:
-                if cols_map[key] > col:
-                    cols_map[key] -= 1
+    @staticmethod
+    def __group_map(groups: Collection[FrozenSet[int]], size: int) -> Tuple[Dict[FrozenSet[int], int], List[List[int]]]:
+        """
+        单元素组直接对应原来的行(列), 多元素组排在原来的行(列)之后, 只保留被映射到的, 保持原来的相对顺序
+        :return: 组 -> 新下标, 每个新下标合并的原下标
+        """
+        position: Dict[FrozenSet[int], int] = {}
+        merged = 0
+        for group in groups:
+            if len(group) == 1:
+                position[group] = next(iter(group))
+                continue
+            position[group] = size + merged
+            merged += 1
+        # 新下标为保留的行(列)中排在它之前的个数
+        rank = {p: k for k, p in enumerate(sorted(set(position.values())))}
+        sources: List[List[int]] = [[] for _ in range(len(rank))]
+        for group, p in position.items():
+            sources[rank[p]] = list(group)
+        return {group: rank[p] for group, p in position.items()}, sources
 
     def __update_con_sub(self, rows_map, cols_map):
         m, n = self.__mat.shape
@@ -114,19 +170,20 @@ class CompressedDM:
         self.__subs = new_subs
 
     def compress(self, all_rows: Collection[FrozenSet[int]], all_cols: Collection[FrozenSet[int]]):
-        rows_map: Dict[FrozenSet[int], int] = {}
-        cols_map: Dict[FrozenSet[int], int] = {}
-        # Step1. 遍历所有的rows
-        for rows in all_rows:
-            rows_map[rows] = self.__compress_rows(rows)
-        # Step2. 遍历所有的cols
-        for cols in all_cols:
-            cols_map[cols] = self.__compress_cols(cols)
-        # Step3. 删除一些无效的行
-        self.__trim_matrix(rows_map, cols_map)
-        # Step4. 更新cons和subs
+        # Step1. 每个行(列)组对应的新下标, 未被映射到的行(列)删除
+        rows_map, row_sources = self.__group_map(all_rows, self.__mat.shape[0])
+        cols_map, col_sources = self.__group_map(all_cols, self.__mat.shape[1])
+        # Step2. 在按位存储的矩阵上合并各组, 分块解压
+        row_flat, row_offsets = group_indexes(row_sources)
+        col_flat, col_offsets = group_indexes(col_sources)
+        self.__mat = self.__mat.andGroups(row_flat, row_offsets, col_flat, col_offsets)
+        if self.__known is not None:
+            self.__known = self.__known.andGroups(row_flat, row_offsets, col_flat, col_offsets)
+            # 结果为0时必有已知的0
+            self.__known.orNot(self.__mat)
+        # Step3. 更新cons和subs
         self.__update_con_sub(rows_map, cols_map)
-        # Step5. 返回
+        # Step4. 返回
         return rows_map, cols_map
 
     @property
@@ -136,3 +193,56 @@ class CompressedDM:
     @property
     def subs(self):
         return self.__subs
+
+
+if __name__ == '__main__':
+    # 压缩耗时随矩阵规模的变化, 矩阵由括号平衡判断构造
+    import random
+    import time
+    from crucio.data_types.grammar import GrammarTokenInstantiator
+    from crucio.grammar_tool import checkBalance
+    from crucio.oracle.string import CachedStringOracle
+    from crucio.oracle.tokenized import TokenizedOracle
+    from crucio.tokenize import Token
+    from crucio.utils.sub_con import Subs, Cons
+
+
+    class BalanceOracle(CachedStringOracle):
+        def _parse(self, sentence):
+            return checkBalance(tuple(Token(i) for i in sentence.split()))
+
+
+    def random_example(length):
+        tokens = []
+        while len(tokens) < length:
+            if random.random() < 0.3:
+                tokens += [Token('L_BRA', '('), Token('a', 'a'), Token('R_BRA', ')')]
+            else:
+                tokens.append(Token(random.choice('ab'), 'x'))
+        return tuple(tokens)
+
+
+    def random_groups(n):
+        indexes = list(range(n))
+        random.shuffle(indexes)
+        groups = []
+        while indexes:
+            size = random.randint(1, 3)
+            groups.append(frozenset(indexes[:size]))
+            indexes = indexes[size:]
+        return groups
+
+
+    random.seed(0)
+    for n_examples in [4, 8, 16, 32]:
+        examples = [random_example(12) for _ in range(n_examples)]
+        dm = DistributionalMatrix(Subs(examples), Cons(examples),
+                                  TokenizedOracle(BalanceOracle(), GrammarTokenInstantiator()))
+        cdm = CompressedDM(dm)
+        shape = cdm.mat.shape
+        start = time.time()
+        rounds = 0
+        while min(cdm.mat.shape) > 1:
+            cdm.compress(random_groups(cdm.mat.shape[0]), random_groups(cdm.mat.shape[1]))
+            rounds += 1
+        print(f'{shape[0]}x{shape[1]}: {rounds} compress in {time.time() - start:.4f}s')
@@ -0,0 +1,350 @@
+"""
+极大团覆盖集的验证: 覆盖集按需流式生成, 可以在进程池中分批并行解析
+"""
+import multiprocessing
+import pickle
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, FrozenSet, Hashable, Iterator, List, Optional, Set, Tuple
+
+from crucio.grammar_tool.earley import EarleyRecognizer, RecognizerOracle
+from crucio.tokenize import Tokens
+from crucio.utils.statistics import counting, hitRecorder, missRecorder
+
+# 工作进程中当前语法的识别器及其版本
+_worker_recognizer: Optional[EarleyRecognizer] = None
+_worker_version = -1
+
+
+def _first_negative(version: int, payload: bytes, batch: List[List[int]]) -> Optional[int]:
+    """
+    :param payload: 版本为 version 的识别器, 工作进程已有这个版本时不再反序列化
+    :param batch: 句子的 token 类型编码, 编码只在主进程中有效, 与识别器中的一致
+    :return: 第一个当前语法不接受的句子的下标, 全部接受时为None
+    """
+    global _worker_recognizer, _worker_version
+    if version != _worker_version:
+        _worker_recognizer = pickle.loads(payload)
+        _worker_version = version
+    for i, codes in enumerate(batch):
+        if not _worker_recognizer.recognize(codes):
+            return i
+    return None
+
+
+class CoveragePool:
+    def __init__(self, workers: int):
+        """
+        验证覆盖集的进程池, 跨 infer_dm 迭代复用.
+        以spawn启动, 不继承主进程的线程(进度条、存储的写线程)及其持有的锁;
+        每次验证前当前语法的识别器序列化一次, 随批次发送, 工作进程按版本缓存
+        """
+        self.workers = workers
+        self.__executor: Optional[ProcessPoolExecutor] = None
+        self.__version = -1
+        self.__payload = b''
+
+    def publish(self, recognizer: EarleyRecognizer):
+        self.__version += 1
+        self.__payload = pickle.dumps(recognizer)
+
+    def submit(self, batch: List[Tokens]) -> Future:
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.__executor.submit(_first_negative, self.__version, self.__payload,
+                                      [[token.code for token in tokens] for tokens in batch])
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+
+class Coverages(dict):
+    def __init__(self, cons, subs, cdm):
+        """
+        团 -> 覆盖集, 第一次读取时才计算
+        """
+        super().__init__()
+        self.__cons = cons
+        self.__subs = subs
+        self.__cdm = cdm
+        self.__bits = None
+
+    def __members(self, clique):
+        clique_cons = set()
+        clique_subs = set()
+        for i in clique:
+            clique_cons.update(self.__cdm.cons[self.__cons[i]])
+            clique_subs.update(self.__cdm.subs[self.__subs[i]])
+        return clique_cons, clique_subs
+
+    def __missing__(self, clique):
+        clique_cons, clique_subs = self.__members(clique)
+        self[clique] = {con.assembly(sub) for con in clique_cons for sub in clique_subs}
+        return self[clique]
+
+    def bubbleBits(self) -> Tuple[Dict[Hashable, int], Dict[Hashable, int]]:
+        """
+        每个上下文(子串)所在压缩组对应的bubble位集, 团的覆盖集包含 con.assembly(sub) 当且仅当
+        两个位集都与团相交
+        """
+        if self.__bits is None:
+            self.__bits = (self.__element_bits(self.__cons, self.__cdm.cons),
+                           self.__element_bits(self.__subs, self.__cdm.subs))
+        return self.__bits
+
+    @staticmethod
+    def __element_bits(indexes, groups) -> Dict[Hashable, int]:
+        group_bits = defaultdict(int)
+        for i, group in enumerate(indexes):
+            group_bits[group] |= 1 << i
+        bits = defaultdict(int)
+        for group, bubbles in group_bits.items():
+            for element in groups[group]:
+                bits[element] |= bubbles
+        return bits
+
+    def pairs(self, clique, priority: Optional[Callable] = None) -> Iterator[Tuple[Hashable, Hashable, Tokens]]:
+        """
+        逐个生成覆盖集中的 (con, sub, 句子), 句子不重复, 完整生成后与 self[clique] 相同并保存
+        :param priority: 上下文和子串的排序键, 按两者名次之和从小到大生成
+        """
+        clique_cons, clique_subs = self.__members(clique)
+        clique_cons, clique_subs = list(clique_cons), list(clique_subs)
+        if priority is not None:
+            clique_cons.sort(key=priority)
+            clique_subs.sort(key=priority)
+        seen = set()
+        n, m = len(clique_cons), len(clique_subs)
+        for d in range(n + m - 1):
+            for i in range(max(0, d - m + 1), min(d, n - 1) + 1):
+                con, sub = clique_cons[i], clique_subs[d - i]
+                sentence = con.assembly(sub)
+                if sentence not in seen:
+                    seen.add(sentence)
+                    yield con, sub, sentence
+        self[clique] = seen
+
+    def stream(self, clique) -> Iterator[Tokens]:
+        """
+        逐个生成覆盖集中的句子
+        """
+        for _, _, sentence in self.pairs(clique):
+            yield sentence
+
+
+class WitnessIndex:
+    def __init__(self):
+        """
+        当前语法不接受的 (con, sub), 跨 infer_dm 迭代保存.
+        语法只会增长, 之前的反例在新的迭代中先重新验证, 仍不接受时直接选中覆盖它的团.
+        同时统计上下文和子串出现在反例中和通过验证的次数, 用于安排覆盖集的验证顺序
+        """
+        self.witnesses: Dict[Tokens, Tuple[Hashable, Hashable]] = {}
+        self.failures = Counter()
+        self.passes = Counter()
+        self.__coverages = None
+        # 本轮已确认仍不接受的句子
+        self.__rejected: Set[Tokens] = set()
+
+    def __begin(self, coverages: Coverages):
+        # 每轮迭代有新的语法和覆盖集
+        if coverages is not self.__coverages:
+            self.__coverages = coverages
+            self.__rejected = set()
+
+    def priority(self, x) -> Tuple[int, int, int]:
+        """
+        出现在反例中多的优先, 其次是通过验证少的和短的
+        """
+        return -self.failures[x], self.passes[x], len(x)
+
+    def add(self, con, sub, sentence: Tokens):
+        self.witnesses[sentence] = (con, sub)
+        self.__rejected.add(sentence)
+        self.failures[con] += 1
+        self.failures[sub] += 1
+
+    def passed(self, con, sub):
+        self.passes[con] += 1
+        self.passes[sub] += 1
+
+    def rejected(self, sentence: Tokens) -> bool:
+        return sentence in self.__rejected
+
+    def confirm(self, clique, coverages: Coverages, oracle) -> bool:
+        """
+        团的覆盖集是否包含仍不接受的已知反例, 已被接受的反例从索引中删除
+        """
+        self.__begin(coverages)
+        if len(self.witnesses) == 0:
+            return False
+        con_bits, sub_bits = coverages.bubbleBits()
+        bits = sum(1 << i for i in clique)
+        for sentence, (con, sub) in list(self.witnesses.items()):
+            if not (con_bits.get(con, 0) & bits and sub_bits.get(sub, 0) & bits):
+                continue
+            if sentence not in self.__rejected:
+                if sentence in oracle.cache or oracle.parse(sentence):
+                    missRecorder('negative witness')
+                    del self.witnesses[sentence]
+                    continue
+                self.__rejected.add(sentence)
+            hitRecorder('negative witness')
+            return True
+        return False
+
+
+def check_coverage(clique, coverages: Coverages, oracle, witnesses: WitnessIndex, batchSize: int = 0) -> bool:
+    """
+    团的覆盖集中是否有当前语法不接受的句子, 按 witnesses 的顺序逐个生成, 找到后停止
+    :param batchSize: >0 时每次把这么多未缓存的句子交给 oracle.batch
+    """
+    pairs = coverages.pairs(clique, witnesses.priority)
+    if batchSize <= 0:
+        for con, sub, sentence in pairs:
+            if sentence in oracle.cache:
+                continue
+            if not oracle.parse(sentence):
+                witnesses.add(con, sub, sentence)
+                return True
+            witnesses.passed(con, sub)
+        return False
+    # 反例多在最前面, 批次从小到大翻倍, 全部接受的大覆盖集才用满 batchSize
+    size = min(8, batchSize)
+    while True:
+        batch = []
+        for pair in pairs:
+            if pair[2] not in oracle.cache:
+                batch.append(pair)
+                if len(batch) == size:
+                    break
+        if len(batch) == 0:
+            return False
+        answers = oracle.batch([sentence for _, _, sentence in batch])
+        for con, sub, sentence in batch:
+            if not answers[sentence]:
+                witnesses.add(con, sub, sentence)
+                return True
+            witnesses.passed(con, sub)
+        size = min(2 * size, batchSize)
+
+
+class CliqueCheck:
+    def __init__(self, clique: FrozenSet[int], pairs: Iterator[Tuple[Hashable, Hashable, Tokens]]):
+        """
+        一个团的验证状态
+        """
+        self.clique = clique
+        self.pairs = pairs
+        self.futures: Set[Future] = set()
+        self.exhausted = False
+        self.valid = False
+
+    def nextBatch(self, oracle, witnesses: WitnessIndex, size: int) -> List[Tuple[Hashable, Hashable, Tokens]]:
+        batch = []
+        while len(batch) < size:
+            pair = next(self.pairs, None)
+            if pair is None:
+                self.exhausted = True
+                break
+            if witnesses.rejected(pair[2]):
+                self.valid = True
+                break
+            if pair[2] not in oracle.cache:
+                batch.append(pair)
+        return batch
+
+    def cancel(self):
+        for future in self.futures:
+            if future.cancel():
+                counting('coverage batches cancelled')
+        self.futures.clear()
+
+
+def drop_after(active: List[CliqueCheck], position: int):
+    """
+    active[position] 已可用, 取消之后所有团的任务
+    """
+    for later in active[position + 1:]:
+        later.cancel()
+    del active[position + 1:]
+
+
+def validate_in_pool(cliques: Iterator[FrozenSet[int]], coverages: Coverages, oracle, witnesses: WitnessIndex,
+                     pool: CoveragePool, batchSize: int) -> Optional[FrozenSet[int]]:
+    """
+    与 get_valid_clique 的结果相同: 按顺序第一个覆盖集中有当前语法不接受的句子的团.
+    同时验证前 workers 个团, 每个团的覆盖集分批提交到进程池, 找到不接受的句子后取消这个团及其后所有团的任务.
+    被取消的团中找到的反例也记入 witnesses
+    :param oracle: IncrementalOracle, 其中当前语法的oracle须为 RecognizerOracle, 接受的句子加入其缓存
+    """
+    if not isinstance(oracle.oracle, RecognizerOracle):
+        raise Exception('coverageWorkers needs Config.nativeRecognizer, only the Earley recognizer is sent to the pool')
+    pool.publish(oracle.oracle.recognizer)
+    workers = pool.workers
+    active: List[CliqueCheck] = []
+    owners: Dict[Future, CliqueCheck] = {}
+    batches: Dict[Future, List[Tuple[Hashable, Hashable, Tokens]]] = {}
+    remaining = True
+    try:
+        while True:
+            # 已找到可用的团时不再验证之后的团
+            while remaining and len(active) < workers and not any(check.valid for check in active):
+                clique = next(cliques, None)
+                if clique is None:
+                    remaining = False
+                    break
+                check = CliqueCheck(clique, coverages.pairs(clique, witnesses.priority))
+                check.valid = witnesses.confirm(clique, coverages, oracle)
+                active.append(check)
+            # 靠前的团优先提交, 每个进程最多排队两批
+            for position, check in enumerate(active):
+                while not check.valid and not check.exhausted and len(owners) < 2 * workers:
+                    batch = check.nextBatch(oracle, witnesses, batchSize)
+                    if len(batch) == 0:
+                        continue
+                    future = pool.submit([sentence for _, _, sentence in batch])
+                    owners[future] = check
+                    batches[future] = batch
+                    check.futures.add(future)
+                if check.valid:
+                    drop_after(active, position)
+                    break
+            # 按顺序丢弃全部接受的团, 第一个未完成的团之前有可用的团就返回
+            while len(active) > 0:
+                head = active[0]
+                if head.valid:
+                    return head.clique
+                if not head.exhausted or len(head.futures) > 0:
+                    break
+                active.pop(0)
+            if len(active) == 0:
+                if not remaining:
+                    return None
+                continue
+            done, _ = wait(list(owners), return_when=FIRST_COMPLETED)
+            for future in done:
+                check = owners.pop(future)
+                batch = batches.pop(future)
+                check.futures.discard(future)
+                if future.cancelled():
+                    continue
+                index = future.result()
+                oracle.update_cache([sentence for _, _, sentence in batch[:index]])
+                for con, sub, _ in batch[:index]:
+                    witnesses.passed(con, sub)
+                if index is None:
+                    continue
+                witnesses.add(*batch[index])
+                # 已取消的团中仍在运行的批次
+                if check.valid or check not in active:
+                    continue
+                check.valid = True
+                check.cancel()
+                drop_after(active, active.index(check))
+    finally:
+        # 进程池留给下一次迭代, 取消排队的批次, 仍在运行的批次很短, 结果丢弃
+        for future in owners:
+            future.cancel()
@@ -1,34 +1,26 @@
 from typing import List
 
+from crucio.config import Config
+from crucio.data_types.graph.clique import BitsetGraph, record_graph, ComponentCliqueSearch
 from crucio.inference.build_dm import build_dm
-from crucio.inference.tree import Bubble, buildGrammar
+from crucio.inference.tree import Bubble, buildGrammar, ForestGrammar
 from crucio.inference.update_graph.envs.compress import CompressedDM
-from crucio.inference.update_graph.envs.util import build_flatten_trees, extract_all_bubbles, build_graph, \
-    assembly_cons_subs, get_valid_clique, fold_bubbles_and_update, \
-    build_matrix_by_lookup_c_wrapped, remove_conflict_inv
+from crucio.inference.update_graph.envs.coverage import Coverages, WitnessIndex, CoveragePool
+from crucio.inference.update_graph.envs.util import build_flatten_trees, extract_all_bubbles, \
+    get_valid_clique, fold_bubbles_and_update, \
+    build_matrix_by_lookup_c_wrapped, remove_conflict_inv, build_adjacency_lazy, update_adjacency
 from crucio.oracle.tokenized import IncrementalOracle
+from crucio.tokenize.span import reset_examples
 from crucio.utils.global_bar import TaskProgress
 from crucio.utils.statistics import RecordTime
 
 
-def get_coverages(cliques, cons, subs, cdm):
-    coverages = {}
-    for clique in cliques:
-        clique_cons = set()
-        clique_subs = set()
-        for i in clique:
-            clique_cons.update(cdm.cons[cons[i]])
-            clique_subs.update(cdm.subs[subs[i]])
-        coverages[clique] = assembly_cons_subs(clique_cons, clique_subs)
-    return coverages
-
-
 def infer_dm(examples, dm):
     ntIndex = 1
     # Step1. 构建树
     trees = build_flatten_trees(examples)
-    # Step2. 构建当前语法以及oracle.
-    g = buildGrammar(trees)
+    # Step2. 构建当前语法以及oracle, 语法在折叠时原地更新
+    g = ForestGrammar(trees)
     o: IncrementalOracle = IncrementalOracle(g.getOracle())
     # Step3. 计算bubbles和上下文以及子串
     bubbles: List[Bubble] = extract_all_bubbles(trees)
@@ -36,27 +28,37 @@ def infer_dm(examples, dm):
     subs = [dm.getIndexBySubseq(bubbles[i].getSeq()) for i in range(len(bubbles))]
     # Step4. 构建cdm
     cdm = CompressedDM(dm)
+    adj = None
+    origins = None
+    search = ComponentCliqueSearch(Config.cliqueWorkers)
+    pool = CoveragePool(Config.coverageWorkers) if Config.coverageWorkers > 1 else None
+    witnesses = WitnessIndex()
     with TaskProgress(initial_description="后续任务") as tp:
         while True:
             with RecordTime('total'):
                 # Step5 构建图
                 tp.update_task('构建交换图')
-                adj = build_matrix_by_lookup_c_wrapped(len(bubbles), subs, cons, cdm)
-                remove_conflict_inv(adj, bubbles)
-                graph = build_graph(adj)
-                # Step6 构建当前语法
+                if adj is not None and Config.incrementalAdjacency:
+                    adj = update_adjacency(adj, origins, bubbles, subs, cons, cdm)
+                elif Config.lazyDM:
+                    adj = build_adjacency_lazy(bubbles, subs, cons, cdm)
+                else:
+                    adj = build_matrix_by_lookup_c_wrapped(len(bubbles), subs, cons, cdm)
+                    remove_conflict_inv(adj, bubbles)
+                if Config.graphRecordDir is not None:
+                    record_graph(adj, Config.graphRecordDir)
+                graph = BitsetGraph(adj)
+                # Step6 当前语法的oracle, 语法没有变化时不重建
                 tp.update_task('构建语法 ')
-                g = buildGrammar(trees)
                 o.update_oracle(g.getOracle())
                 # Step7 计算极大团
                 tp.update_task('计算极大团')
-                cliques = graph.getFastMaximalCliques(True)
-                # Step8 计算覆盖集
-                tp.update_task('计算覆盖集')
-                coverages = get_coverages(cliques, cons, subs, cdm)
+                cliques = search.search(graph, bubbles, True, Config.cliqueTimeLimit, Config.cliqueLimit)
+                # Step8 覆盖集在选取极大团时按需计算
+                coverages = Coverages(cons, subs, cdm)
                 # Step9. 选取极大团
                 tp.update_task('选取极大团')
-                clique = get_valid_clique(cliques, coverages, o)
+                clique = get_valid_clique(cliques, coverages, o, witnesses, pool)
                 if clique is None:
                     break
                 o.update_cache(coverages[clique])
@@ -65,14 +67,19 @@ def infer_dm(examples, dm):
                 target_bubbles = [bubbles[i] for i in clique]
                 nt = f'n{ntIndex}'
                 ntIndex += 1
-                bubbles, cons, subs = fold_bubbles_and_update(target_bubbles, nt, bubbles, cons, subs, cdm)
+                bubbles, cons, subs, origins = fold_bubbles_and_update(target_bubbles, nt, bubbles, cons, subs, cdm, g)
                 # print(buildGrammar(trees))
             tp.advance(1)
+    search.close()
+    if pool is not None:
+        pool.close()
     # showStatistics()
+    # 产生式的顺序与逐棵树构建的一致
     return buildGrammar(trees)
 
 
 def infer(examples, oracle):
+    reset_examples()
     dm = build_dm(examples, oracle)
     return infer_dm(examples, dm)
 
@@ -1,24 +1,35 @@
 import itertools
+import os
 import queue
 import random
 from collections import defaultdict
-from typing import List, Tuple, Dict, Collection, Set, Optional, Any
+from typing import List, Tuple, Dict, Collection, Set, Optional, Any, Iterator
 
 import numpy as np
 from tqdm import tqdm
 
-from compute_T import build_matrix_by_lookup_c
+from crucio.config import Config
+from crucio.data_types.distribution.bitmatrix import unpack
 from crucio.data_types.distribution.matrix import DistributionalMatrix
 from crucio.data_types.graph.undirected_graph import UndirectedGraph
 from crucio.data_types.interval_example import isConflict, IntervalExample
 from crucio.grammar_tool import checkBalance
-from crucio.inference.tree import Node, getNtDict, Bubble, buildTree
+from crucio.inference.tree import Node, getNtDict, Bubble, buildTree, ForestGrammar
 from crucio.inference.update_graph.env import getParent, Interval
 from crucio.inference.update_graph.envs.compress import CompressedDM
+from crucio.inference.update_graph.envs.coverage import validate_in_pool, WitnessIndex, check_coverage, CoveragePool
 from crucio.inference.update_graph.query import MatrixQuerier
+from crucio.oracle import ExtendOracle
 from crucio.tokenize import TokenizedContext, Tokens
+from crucio.tokenize.span import example_table
 from crucio.utils.statistics import timer, RecordTime
 
+try:
+    from compute_T import build_adjacency_bits_c
+except ImportError:
+    # 没有编译Cython扩展(或扩展是旧版本)时用numpy实现
+    build_adjacency_bits_c = None
+
 
 def extract_all_bubbles(trees: List[Node]):
     bubbles = set()
@@ -228,24 +239,36 @@ def build_flatten_trees(examples):
 @timer('build_graph')
 def build_graph(adjacent_mat):
     g = UndirectedGraph()
-    n = adjacent_mat.shape[0]
-    for i, j in itertools.combinations(range(n), 2):
-        if adjacent_mat[i, j]:
-            g.addEdge(i, j, True)
+    # 与按 combinations 遍历上三角的顺序相同
+    for i, j in zip(*np.nonzero(np.triu(adjacent_mat, 1))):
+        g.addEdge(int(i), int(j), True)
     return g
 
 
 
 
 @timer('get_valid_clique')
-def get_valid_clique(cliques, coverages, oracle):
+def get_valid_clique(cliques, coverages, oracle, witnesses: Optional[WitnessIndex] = None,
+                     pool: Optional[CoveragePool] = None):
+    """
+    :param cliques: 极大团的集合, 或已按大小从大到小排列的迭代器(只读取到第一个可用的团)
+    :param coverages: Coverages, 覆盖集逐个生成, 找到当前语法不接受的句子就停止
+    :param witnesses: 跨迭代保存的反例, 先验证覆盖集中的已知反例, 再按其统计的失败可能性排列覆盖集
+    :param pool: 给出时在进程池中验证, 见 Config.coverageWorkers
+    """
+    if not isinstance(cliques, Iterator):
+        cliques = iter(sorted(cliques, key=len, reverse=True))
+    if witnesses is None:
+        witnesses = WitnessIndex()
+    if pool is not None:
+        return validate_in_pool(cliques, coverages, oracle, witnesses, pool, Config.coverageBatch)
+    # 语法oracle支持批量识别时按批验证
+    batchSize = Config.coverageBatch if Config.batchRecognizer and isinstance(oracle.oracle, ExtendOracle) else 0
     # 更新n，使用n+1来预测
-    for clique in sorted(cliques, key=len, reverse=True):
-        for i in sorted(coverages[clique]):
-            if i in oracle.cache:
-                continue
-            if not oracle.parse(i):
-                return clique
+    for clique in cliques:
+        if witnesses.confirm(clique, coverages, oracle) or check_coverage(clique, coverages, oracle, witnesses,
+                                                                           batchSize):
+            return clique
     return None
 
 
@@ -253,10 +276,10 @@ def assembly_cons_subs(cons, subs):
     return {con.assembly(sub) for con in cons for sub in subs}
 
 
-def fold_bubble(bubble: Bubble, nt, bubbles: List[Bubble]):
+def fold_bubble(bubble: Bubble, nt, bubbles: List[Bubble], grammar: Optional[ForestGrammar] = None):
     bubble_map = build_bubble_map(bubble, bubbles)
-    # Step2. 折叠当前Bubble
-    nt_node = bubble.fold(nt)
+    # Step2. 折叠当前Bubble, 同时更新语法
+    nt_node = bubble.fold(nt) if grammar is None else grammar.fold(bubble, nt)
     # Step3. 替换占位符
     for value in bubble_map.values():
         for b in value:
@@ -280,10 +303,10 @@ def compress_bubble_map(bubble_map1: Dict[Bubble, List[Bubble]], bubble_map2: Di
 
 
 @timer('fold_bubbles')
-def fold_bubbles(fold: Collection[Bubble], nt, bubbles: List[Bubble]):
+def fold_bubbles(fold: Collection[Bubble], nt, bubbles: List[Bubble], grammar: Optional[ForestGrammar] = None):
     bubble_map = {bubble: [bubble] for bubble in bubbles}
     for bubble in sorted(fold, key=len, reverse=True):
-        single_bubble_map, bubbles = fold_bubble(bubble, nt, bubbles)
+        single_bubble_map, bubbles = fold_bubble(bubble, nt, bubbles, grammar)
         bubble_map = compress_bubble_map(bubble_map, single_bubble_map)
     return bubble_map, bubbles
 
@@ -295,7 +318,21 @@ def build_matrix_by_lookup_c_wrapped(
         col_map: List[int],
         matrix
 ) -> np.ndarray:
-    return build_matrix_by_lookup_c(n, row_map, col_map, matrix.mat)
+    """
+    交换图的邻接矩阵 adj[i, j] = mat[row_map[i], col_map[j]] & mat[row_map[j], col_map[i]]
+    :param matrix: CompressedDM
+    """
+    # 只解压用到的行列, 下标换成在其中的位置
+    row_ids, rows = np.unique(np.asarray(row_map[:n], dtype=np.int64), return_inverse=True)
+    col_ids, cols = np.unique(np.asarray(col_map[:n], dtype=np.int64), return_inverse=True)
+    rows, cols = rows.astype(np.int64), cols.astype(np.int64)
+    mat = matrix.block(row_ids, col_ids)
+    if build_adjacency_bits_c is None:
+        block = mat[np.ix_(rows, cols)].astype(np.bool_)
+        return block & block.T
+    bits = build_adjacency_bits_c(rows, cols, np.ascontiguousarray(mat, dtype=np.uint8),
+                                  Config.adjacencyThreads or os.cpu_count())
+    return unpack(bits, n).astype(np.bool_)
 
 
 
@@ -369,22 +406,23 @@ def get_nt_dict(bubbles: Collection[Bubble]):
 
 
 @timer('fold_bubbles_and_update')
-def fold_bubbles_and_update(bubbles_fold, nt, old_bubbles, cons, subs, cdm):
+def fold_bubbles_and_update(bubbles_fold, nt, old_bubbles, cons, subs, cdm, grammar: Optional[ForestGrammar] = None):
     """
 
+    :param grammar: 树对应的语法, 折叠时原地更新
     :param cdm:
     :param bubbles_fold:
     :param nt:
     :param old_bubbles:
     :param cons:
     :param subs:
-    :return:
+    :return: 新的bubbles, cons, subs, 以及每个新bubble沿用的旧bubble下标(见update_adjacency)
     """
     """
     Step1. fold all Bubbles
     """
     with RecordTime('fold all Bubbles'):
-        bubble_map, new_bubbles = fold_bubbles(bubbles_fold, nt, old_bubbles)
+        bubble_map, new_bubbles = fold_bubbles(bubbles_fold, nt, old_bubbles, grammar)
         n = len(new_bubbles)
         # 处理映射
         bubble_map_numeric = translate_bubble_map(bubble_map, old_bubbles, new_bubbles)
@@ -410,14 +448,25 @@ def fold_bubbles_and_update(bubbles_fold, nt, old_bubbles, cons, subs, cdm):
     """
     with RecordTime('计算nt对应的bubble'):
         nt_bubbles = [inv_new_bubbles[Bubble(i, i)] for i in nt_dict[nt]]
-    # Step5. 获取更新后的con/sub
+    """
+    Step5. 未被折叠改变且con/sub都没有更新的bubble, 其邻接关系可以沿用
+    """
+    with RecordTime('compute bubble origins'):
+        origins = np.full(n, -1, dtype=np.int64)
+        for i, targets in enumerate(bubble_map_numeric):
+            for j in targets:
+                if new_bubbles[j] == old_bubbles[i]:
+                    origins[j] = i
+        origins[con_related_bubbles] = -1
+        origins[sub_related_bubbles] = -1
+    # Step6. 获取更新后的con/sub
     return new_bubbles, *update_con_sub(nt_bubbles,
                                         approx_new_cons,
                                         approx_new_subs,
                                         con_related_bubbles,
                                         sub_related_bubbles,
                                         cdm
-                                        )
+                                        ), origins
 
 
 @timer('remove_conflict_inv')
@@ -439,6 +488,102 @@ def remove_conflict_inv(adj: np.ndarray, bubbles: List["Bubble"]):
                 adj[i, j] = adj[j, i] = 0
 
 
+def conflict_mask(bubbles: List["Bubble"]) -> np.ndarray:
+    """
+    remove_conflict_inv 的向量化版本, 返回冲突的bubble对
+    """
+    return conflict_rows(bubbles, np.arange(len(bubbles)))
+
+
+def conflict_rows(bubbles: List["Bubble"], rows: np.ndarray) -> np.ndarray:
+    """
+    conflict_mask 中 rows 对应的行, 形状为 (len(rows), len(bubbles))
+    """
+    ie_map: List[IntervalExample] = [b.getIE() for b in bubbles]
+    table = example_table()
+    example = np.array([table.intern(ie.example) for ie in ie_map], dtype=np.int64)
+    left = np.array([ie.left for ie in ie_map], dtype=np.int64)
+    right = np.array([ie.right for ie in ie_map], dtype=np.int64)
+    e1, e2 = example[rows][:, None], example[None, :]
+    l1, l2 = left[rows][:, None], left[None, :]
+    r1, r2 = right[rows][:, None], right[None, :]
+    # 同一个例子中相交且互不包含
+    overlap = (l1 < r2) & (l2 < r1)
+    nested = ((l1 <= l2) & (r1 >= r2)) | ((l2 <= l1) & (r2 >= r1))
+    return (e1 == e2) & overlap & ~nested
+
+
+@timer('build_adjacency_lazy')
+def build_adjacency_lazy(bubbles: List["Bubble"], subs: List[int], cons: List[int], cdm: CompressedDM) -> np.ndarray:
+    """
+    惰性分布矩阵下构建交换图的邻接矩阵, 只计算需要读取的单元.
+    adj[i, j] = mat[subs[i], cons[j]] & mat[subs[j], cons[i]], 分两阶段计算:
+    阶段1计算上三角方向的单元, 阶段2只对阶段1为1的bubble对计算反方向的单元. 冲突的bubble对不计算.
+    """
+    subs = np.asarray(subs, dtype=np.int64)
+    cons = np.asarray(cons, dtype=np.int64)
+    candidates = np.triu(~conflict_mask(bubbles), 1)
+
+    def view():
+        return cdm.block(subs, cons).astype(np.bool_), cdm.known_block(subs, cons)
+
+    # 阶段1: 反方向已知为0的跳过
+    values, known = view()
+    i, j = np.nonzero(candidates & ~known & ~(known.T & ~values.T))
+    cdm.resolve(subs[i], cons[j])
+    # 阶段2: 正方向为1时才需要反方向
+    values, known = view()
+    i, j = np.nonzero(candidates & known & values & ~known.T)
+    cdm.resolve(subs[j], cons[i])
+    values, _ = view()
+    adj = candidates & values & values.T
+    adj = adj | adj.T
+    np.fill_diagonal(adj, np.diag(values))
+    return adj
+
+
+def adjacency_rows(rows: np.ndarray, bubbles: List["Bubble"], subs: List[int], cons: List[int],
+                   cdm: CompressedDM) -> np.ndarray:
+    """
+    邻接矩阵中 rows 对应的行, 已去掉冲突的bubble对. 惰性分布矩阵下先批量计算需要读取的单元
+    """
+    subs = np.asarray(subs, dtype=np.int64)
+    cons = np.asarray(cons, dtype=np.int64)
+    row_subs, row_cons = subs[rows], cons[rows]
+    candidates = ~conflict_rows(bubbles, rows)
+    if Config.lazyDM:
+        # 正方向 mat[subs[rows], cons], 为1时才需要反方向 mat[subs, cons[rows]]
+        i, j = np.nonzero(candidates & ~cdm.known_block(row_subs, cons))
+        cdm.resolve(row_subs[i], cons[j])
+        forward = cdm.block(row_subs, cons).astype(np.bool_)
+        i, j = np.nonzero(candidates & forward & ~cdm.known_block(subs, row_cons).T)
+        cdm.resolve(subs[j], row_cons[i])
+    forward = cdm.block(row_subs, cons).astype(np.bool_)
+    backward = cdm.block(subs, row_cons).astype(np.bool_).T
+    return candidates & forward & backward
+
+
+@timer('update_adjacency')
+def update_adjacency(adj: np.ndarray, origins: np.ndarray, bubbles: List["Bubble"], subs: List[int],
+                     cons: List[int], cdm: CompressedDM) -> np.ndarray:
+    """
+    折叠后增量更新邻接矩阵, 只重新计算折叠影响到的行.
+    bubble的区间和所在例子不随折叠改变, 沿用的bubble之间的冲突关系不变; 它们的con/sub只是重新编号, 对应的矩阵单元也不变.
+    :param adj: 上一轮的邻接矩阵
+    :param origins: fold_bubbles_and_update 返回的旧下标, -1 表示需要重新计算
+    """
+    n = len(bubbles)
+    carried = np.flatnonzero(origins >= 0)
+    fresh = np.flatnonzero(origins < 0)
+    new_adj = np.zeros((n, n), dtype=np.bool_)
+    new_adj[np.ix_(carried, carried)] = adj[np.ix_(origins[carried], origins[carried])]
+    if len(fresh) > 0:
+        rows = adjacency_rows(fresh, bubbles, subs, cons, cdm)
+        new_adj[fresh, :] = rows
+        new_adj[:, fresh] = rows.T
+    return new_adj
+
+
 def evaluatePm(trees: List[Node], oracle):
     nt_dict = getNtDict(trees)
     cons_map = defaultdict(set)
@@ -11,7 +11,7 @@ from crucio.oracle.tokenized import TokenizedOracle
 from crucio.tokenize import SupportAssembly, Token, Tokens, pretty_tokens, Tokenizer, TokenizedContext
 from crucio.utils.dfa import dfa_accepts
 from crucio.utils.global_bar import rqdm
-from crucio.utils.statistics import timer, counting
+from crucio.utils.statistics import timer, counting, phase
 from crucio.lexical.classifier.dfa import DfaInferencer
 
 
@@ -142,8 +142,9 @@ class LexicalRule:
         # Step1. add to decision tree
         self.qt.add(example)
         start = self.oracle.raw().calls
-        self.tree.add(example)
-        self.tree.update_node(self.qt)
+        with phase('classify'):
+            self.tree.add(example)
+            self.tree.update_node(self.qt)
         counting('classify calls=', self.oracle.raw().calls - start)
         # Step2. extract decision tree paths
         path = self.tree.get_paths()
@@ -152,6 +153,7 @@ class LexicalRule:
             self._update_rule(path, tokens)
 
     @timer('lexical-sampling')
+    @phase('lexical check')
     def check(self, example: Tokens):
         positions = defaultdict(list)
         q = {}
@@ -2,6 +2,7 @@ from crucio.lexical.infer.lexical_infer import lexical_infer2, separate_string,
 from crucio.oracle import StringOracle
 from crucio.utils.dfa import dfa_accepts
 from crucio.utils.log import dummy
+from crucio.utils.statistics import phase
 
 
 def lexical_infer3(oracle,examples,logger=dummy):
@@ -39,6 +40,7 @@ class DfaInferencer:
                 return True
         return False
 
+    @phase('lexical infer')
     def infer(self, example):
         if self.is_learned(example):
             return
@@ -12,11 +12,12 @@ from crucio.lexical.infer.segment.split import PreSegmenter, Node, LexicalGroup,
 from crucio.lexical.lexicalBuild.automations import make_dfa_from_triples
 from crucio.lexical.lexicalBuild.infer import infer_dfa
 from crucio.oracle import StringOracle
+from crucio.oracle.cache import OracleCache
 from crucio.oracle.string import CachedStringOracle
 from crucio.oracle.tokenized import TokenizedOracle
 from crucio.tokenize import SupportAssembly, Token, TokenizedContext
 from crucio.utils.log import dummy
-from crucio.utils.statistics import timer, counter, counting
+from crucio.utils.statistics import timer, counter, counting, phase
 
 
 
@@ -26,7 +27,7 @@ def get_token_oracle(oracle: CachedStringOracle, insensitive_chars):
         ins = SepTokenInstantiator('')
     else:
         ins = SepTokenInstantiator(' ')
-    return TokenizedOracle(oracle, ins)
+    return TokenizedOracle(oracle, ins, OracleCache(oracle))
 
 
 def seg2indexes(seg: Segmentation):
@@ -39,6 +40,9 @@ def seg2indexes(seg: Segmentation):
 
 
 class ContextualCharOracle(CachedStringOracle):
+    # answered by the tokenized oracle, which is profiled itself
+    profiled = False
+
     def __init__(self, contexts: List[Tuple[SupportAssembly, bool]], oracle: TokenizedOracle, insensitive_chars):
         super().__init__()
         self.contexts = sorted(contexts, key=lambda x: x[1], reverse=True)
@@ -283,6 +287,7 @@ def build_string_dfa(border):
 
 
 
+@phase('segmentation')
 def segment_examples(examples: List[str], oracle: CachedStringOracle, logger=dummy):
     # Step1. segment by pre-defined rule
     segs = PreSegmenter.segmentAll(examples)
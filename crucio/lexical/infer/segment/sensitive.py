@@ -2,6 +2,7 @@ from typing import List
 
 from crucio.data_types.lexical import Segmentation
 from crucio.oracle.string import CachedStringOracle
+from crucio.utils.statistics import phase
 
 
 def replace_seg(seg, target, replacement):
@@ -27,6 +28,7 @@ def is_char_sensitive(char, segs: List[Segmentation], oracle: CachedStringOracle
         return True
 
 
+@phase('sensitivity')
 def get_insensitive_chars(segs: List[Segmentation], oracle: CachedStringOracle) -> List[str]:
     ans = []
     for char in ' \t\n\r':
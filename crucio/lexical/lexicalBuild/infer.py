@@ -4,8 +4,10 @@ from aalpy import SUL
 from aalpy.automata import Dfa
 
 from crucio.lexical.infer.lstar.oracle import MemberBasedEqvOracle
+from crucio.utils.statistics import phase
 
 
+@phase('L*')
 def infer_dfa(oracle: SUL, examples: Collection[str], alphabet: List[str]) -> Dfa:
     eq = MemberBasedEqvOracle(examples, alphabet, oracle)
     from aalpy import run_Lstar
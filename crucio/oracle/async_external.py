@@ -0,0 +1,132 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+import time
+from collections import deque
+from typing import Collection, Dict, Optional, Tuple
+
+from crucio.oracle.command import build_command
+from crucio.oracle.store import OracleStore
+from crucio.oracle.string import CachedStringOracle
+from crucio.utils.statistics import average, counting
+
+
+class LatencyTracker:
+    def __init__(self, initial: float = 10, minimum: float = 1, maximum: float = 60, factor: float = 4,
+                 quantile: float = 0.99, warmup: int = 20, window: int = 1000):
+        """
+        Timeout derived from the observed latencies: `factor` times the `quantile` of the last
+        `window` calls, clamped to [minimum, maximum]. `initial` is used until `warmup` calls are seen.
+        """
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.quantile = quantile
+        self.warmup = warmup
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        average('oracle latency', latency)
+
+    def timeout(self) -> float:
+        if len(self.samples) < self.warmup:
+            return self.initial
+        ordered = sorted(self.samples)
+        q = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return min(self.maximum, max(self.minimum, q * self.factor))
+
+
+class AsyncExternalOracle(CachedStringOracle):
+    def __init__(self, command, concurrency: int = os.cpu_count(), timeout: Optional[float] = None,
+                 store: Optional[OracleStore] = None):
+        """
+        Same oracle call as `ExternalOracle`, but many calls overlap on one event loop.
+        :param concurrency: maximum number of oracle processes alive at once
+        :param timeout: fixed timeout in seconds, None adapts it to the observed latencies
+        """
+        super().__init__(store)
+        self.command = command
+        self.concurrency = concurrency
+        self.latency = LatencyTracker() if timeout is None else LatencyTracker(timeout, timeout, timeout)
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __event_loop(self) -> asyncio.AbstractEventLoop:
+        # one loop for every synchronous call, asyncio.run would create and close a loop per query
+        if self.__loop is None or self.__loop.is_closed():
+            self.__loop = asyncio.new_event_loop()
+        return self.__loop
+
+    async def __call(self, sentence: str, semaphore: asyncio.Semaphore) -> Tuple[Optional[bool], float]:
+        async with semaphore:
+            with tempfile.NamedTemporaryFile() as f:
+                f.write(bytes(sentence, 'utf-8'))
+                f.flush()
+                timeout = self.latency.timeout()
+                start = time.time()
+                proc = await asyncio.create_subprocess_exec(*build_command(self.command, f.name),
+                                                            stdout=subprocess.DEVNULL,
+                                                            stderr=subprocess.DEVNULL)
+                try:
+                    returncode = await asyncio.wait_for(proc.wait(), timeout)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    print(f"Caused timeout: {sentence}")
+                    counting('async oracle timeouts')
+                    return None, time.time() - start
+                cost = time.time() - start
+                self.latency.record(cost)
+                return returncode == 0, cost
+
+    async def parse_many(self, sentences: Collection[str], desc='AsyncParse',
+                         owner: Optional[CachedStringOracle] = None) -> Dict[str, bool]:
+        """
+        :param owner: oracle whose cache and accounting the answers go through, i.e. a RecordingOracle
+        in front of this one, this oracle by default
+        """
+        from crucio.utils.global_bar import RichBar
+        owner = self if owner is None else owner
+        answers = {sentence: owner.lookup(sentence) for sentence in set(sentences)}
+        unknown = [sentence for sentence, ans in answers.items() if ans is None]
+        if len(unknown) == 0:
+            return answers
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bar = RichBar([], len(unknown), desc)
+
+        async def call(sentence):
+            ans, cost = await self.__call(sentence, semaphore)
+            owner.remember(sentence, ans, cost)
+            answers[sentence] = bool(ans)
+            bar.inc()
+
+        try:
+            await asyncio.gather(*[call(sentence) for sentence in unknown])
+        finally:
+            bar.close()
+        return answers
+
+    def parse_many_sync(self, sentences: Collection[str], desc='AsyncParse',
+                        owner: Optional[CachedStringOracle] = None) -> Dict[str, bool]:
+        """
+        blocking adapter for synchronous callers
+        """
+        return self.__event_loop().run_until_complete(self.parse_many(sentences, desc, owner))
+
+    async def __call_alone(self, sentence: str) -> Tuple[Optional[bool], float]:
+        return await self.__call(sentence, asyncio.Semaphore(1))
+
+    def _parse(self, sentence: str) -> Optional[bool]:
+        return self.__event_loop().run_until_complete(self.__call_alone(sentence))[0]
+
+    def close(self):
+        if self.__loop is not None:
+            self.__loop.close()
+            self.__loop = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_AsyncExternalOracle__loop'] = None
+        return state
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Dict, Iterator, Tuple, Iterable
+
+from crucio.config import Config
+from crucio.tokenize import TokenInterner, Tokens
+from crucio.utils.statistics import hitRecorder, missRecorder
+
+
+class CacheTier:
+    def __init__(self, name: str, key: Optional[Callable[[Hashable], Hashable]] = None,
+                 max_negatives: Optional[int] = None):
+        """
+        One level of the oracle cache. Positives are kept for the whole run, negatives are evicted
+        least recently used first once there are more than `max_negatives` of them.
+        :param name: reported to `hitRecorder`/`missRecorder`
+        :param key: maps a query to the stored key, i.e. `TokenInterner.key`
+        :param max_negatives: None keeps every negative
+        """
+        self.name = name
+        self.key = key
+        self.max_negatives = max_negatives
+        self.positives = set()
+        self.negatives = OrderedDict()
+
+    def __key(self, obj: Hashable) -> Hashable:
+        return obj if self.key is None else self.key(obj)
+
+    def __get(self, k: Hashable) -> Optional[bool]:
+        if k in self.positives:
+            return True
+        if k in self.negatives:
+            self.negatives.move_to_end(k)
+            return False
+        return None
+
+    def lookup(self, obj: Hashable) -> Optional[bool]:
+        """
+        the cached answer, None if unknown
+        """
+        ans = self.__get(self.__key(obj))
+        if ans is None:
+            missRecorder(self.name)
+        else:
+            hitRecorder(self.name)
+        return ans
+
+    def get(self, obj: Hashable, default=None) -> Optional[bool]:
+        ans = self.__get(self.__key(obj))
+        return default if ans is None else ans
+
+    def __contains__(self, obj: Hashable) -> bool:
+        k = self.__key(obj)
+        return k in self.positives or k in self.negatives
+
+    def __getitem__(self, obj: Hashable) -> bool:
+        ans = self.__get(self.__key(obj))
+        if ans is None:
+            raise KeyError(obj)
+        return ans
+
+    def __setitem__(self, obj: Hashable, ans: bool):
+        k = self.__key(obj)
+        if ans:
+            self.negatives.pop(k, None)
+            self.positives.add(k)
+            return
+        if k in self.positives:
+            return
+        self.negatives[k] = False
+        self.negatives.move_to_end(k)
+        if self.max_negatives is not None:
+            while len(self.negatives) > self.max_negatives:
+                self.negatives.popitem(last=False)
+
+    def add(self, obj: Hashable):
+        self[obj] = True
+
+    def update(self, answers):
+        """
+        :param answers: a dict of answers, or a collection of positives
+        """
+        if isinstance(answers, dict):
+            for obj, ans in answers.items():
+                self[obj] = ans
+        else:
+            for obj in answers:
+                self[obj] = True
+
+    def keys(self) -> Iterable[Hashable]:
+        yield from self.positives
+        yield from self.negatives
+
+    def items(self) -> Iterator[Tuple[Hashable, bool]]:
+        for k in self.positives:
+            yield k, True
+        for k in self.negatives:
+            yield k, False
+
+    def clear(self):
+        self.positives.clear()
+        self.negatives.clear()
+
+    def __len__(self):
+        return len(self.positives) + len(self.negatives)
+
+
+class OracleCache:
+    def __init__(self, raw, interner: Optional[TokenInterner] = None, max_negatives: Optional[int] = None):
+        """
+        The cache hierarchy in front of an external oracle: the token tier answers a token sequence
+        without instantiating it, the string tier is the cache of the raw `CachedStringOracle`.
+        :param raw: the CachedStringOracle behind the TokenizedOracle
+        :param max_negatives: defaults to `Config.oracleCacheNegatives`
+        """
+        if max_negatives is None:
+            max_negatives = Config.oracleCacheNegatives
+        self.interner = interner if interner is not None else TokenInterner()
+        self.tokens = CacheTier('token cache', self.interner.key, max_negatives)
+        self.strings: CacheTier = raw.cache
+
+    def lookup(self, tokens: Tokens) -> Optional[bool]:
+        return self.tokens.lookup(tokens)
+
+    def remember(self, tokens: Tokens, ans: bool):
+        self.tokens[tokens] = ans
+
+    def tiers(self) -> Dict[str, CacheTier]:
+        return {self.tokens.name: self.tokens, self.strings.name: self.strings}
@@ -0,0 +1,156 @@
+import os
+import tempfile
+import threading
+from abc import abstractmethod
+from multiprocessing.util import Finalize
+from typing import Optional, Tuple, Dict, Any, Union, List
+
+
+class ChannelInput:
+    def __init__(self, path: Optional[str], data: Optional[bytes] = None, pass_fds: Tuple[int, ...] = (),
+                 release=None):
+        """
+        :param path: file argument of the oracle call, None if the input goes through stdin
+        :param data: bytes piped to stdin
+        :param pass_fds: descriptors the oracle process must inherit
+        :param release: called once the oracle process finished
+        """
+        self.path = path
+        self.data = data
+        self.pass_fds = pass_fds
+        self.__release = release
+
+    def run_kwargs(self) -> Dict[str, Any]:
+        kwargs = {}
+        if self.data is not None:
+            kwargs['input'] = self.data
+        if len(self.pass_fds) > 0:
+            kwargs['pass_fds'] = self.pass_fds
+        return kwargs
+
+    def release(self):
+        if self.__release is not None:
+            self.__release()
+
+
+class InputChannel:
+    """
+    How an ExternalOracle hands the input to the oracle process.
+    """
+
+    @abstractmethod
+    def prepare(self, data: bytes) -> ChannelInput:
+        pass
+
+
+class FileChannel(InputChannel):
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+
+    def prepare(self, data: bytes) -> ChannelInput:
+        f = tempfile.NamedTemporaryFile(dir=self.directory)
+        f.write(data)
+        f.flush()
+        return ChannelInput(f.name, release=f.close)
+
+
+class StdinChannel(InputChannel):
+    def prepare(self, data: bytes) -> ChannelInput:
+        return ChannelInput(None, data)
+
+
+class MemfdChannel(InputChannel):
+    """
+    Linux only, the input lives in an anonymous memory file passed as /proc/self/fd/N
+    """
+
+    def __init__(self):
+        if not hasattr(os, 'memfd_create'):
+            raise Exception('memfd_create is not available on this platform')
+
+    def prepare(self, data: bytes) -> ChannelInput:
+        fd = os.memfd_create('crucio-oracle')
+        os.write(fd, data)
+        os.lseek(fd, 0, os.SEEK_SET)
+        return ChannelInput(f'/proc/self/fd/{fd}', pass_fds=(fd,), release=lambda: os.close(fd))
+
+
+class TmpfsChannel(InputChannel):
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Scratch files opened once and rewritten in place for every call. A call takes a free scratch file
+        and gives it back once the oracle finished, so there are as many files as calls running at once,
+        whichever threads make them. A forked process makes its own files and removes them when it exits.
+        :param directory: defaults to /dev/shm where available
+        """
+        if directory is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.directory = directory
+        self.__lock = threading.Lock()
+        self.__pid = os.getpid()
+        self.__scratches: List[Tuple[str, int]] = []
+        self.__free: List[Tuple[str, int]] = []
+
+    def __acquire(self) -> Tuple[str, int]:
+        with self.__lock:
+            if self.__pid != os.getpid():
+                # the files of the parent are still in use there
+                self.__pid = os.getpid()
+                self.__scratches = []
+                self.__free = []
+            if len(self.__free) > 0:
+                return self.__free.pop()
+            if len(self.__scratches) == 0:
+                # runs at exit of the main process and of multiprocessing workers
+                Finalize(self, TmpfsChannel.__remove, args=(self.__scratches,), exitpriority=0)
+            fd, path = tempfile.mkstemp(prefix='crucio-oracle-', dir=self.directory)
+            self.__scratches.append((path, fd))
+            return path, fd
+
+    def __release(self, scratch: Tuple[str, int]):
+        with self.__lock:
+            if self.__pid == os.getpid():
+                self.__free.append(scratch)
+
+    def prepare(self, data: bytes) -> ChannelInput:
+        scratch = self.__acquire()
+        path, fd = scratch
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, data, 0)
+        return ChannelInput(path, release=lambda: self.__release(scratch))
+
+    @staticmethod
+    def __remove(scratches: List[Tuple[str, int]]):
+        for path, fd in scratches:
+            os.close(fd)
+            if os.path.exists(path):
+                os.remove(path)
+        scratches.clear()
+
+    def close(self):
+        with self.__lock:
+            if self.__pid == os.getpid():
+                TmpfsChannel.__remove(self.__scratches)
+                self.__free.clear()
+
+    def __getstate__(self):
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+
+channels = {
+    'file': FileChannel,
+    'stdin': StdinChannel,
+    'memfd': MemfdChannel,
+    'tmpfs': TmpfsChannel,
+}
+
+
+def get_channel(channel: Union[str, InputChannel]) -> InputChannel:
+    if isinstance(channel, InputChannel):
+        return channel
+    if channel not in channels:
+        raise Exception(f'Unknown input channel {channel}, expected one of {list(channels)}')
+    return channels[channel]()
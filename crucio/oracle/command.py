@@ -0,0 +1,23 @@
+from typing import List, Optional
+
+
+def build_command(command: str, f_name: Optional[str]) -> List[str]:
+    """
+    Build the argv of an oracle call on the input file `f_name`, None if the oracle reads its stdin.
+    `.sh` and `.py` oracles are run through their interpreter, `java X` runs the class X.
+    """
+    interpreter = ''
+    op1 = command
+    if command.endswith('.sh'):
+        interpreter = 'bash'
+    elif command.endswith('.py'):
+        interpreter = 'python3'
+    elif command.startswith('java'):
+        interpreter = 'java'
+        op1 = command.split(' ')[1]
+    commands = [interpreter, op1]
+    if f_name is not None:
+        commands.append(f_name)
+    if commands[0] == '':
+        commands = commands[1:]
+    return commands
@@ -0,0 +1,23 @@
+from crucio.config import Config
+from crucio.oracle import ExtendOracle, Oracle
+
+
+def get_extend_oracle(oracle: Oracle) -> ExtendOracle:
+    """
+    batch oracle configured by `Config.oracleWorkers` and `Config.oracleWorkerMode`,
+    oracles backed by an AsyncExternalOracle always run their batches on its event loop.
+    Oracles not backed by a CachedStringOracle are batched sequentially
+    """
+    from crucio.oracle.async_external import AsyncExternalOracle
+    from crucio.oracle.extend.asynchronous import AsyncExtendOracle
+    from crucio.oracle.extend.naive import NaiveExtendOracle
+    from crucio.oracle.extend.parallel import ParallelExtendOracle, split_oracle
+    from crucio.oracle.string import CachedStringOracle
+    from crucio.oracle.tokenized import TokenizedOracle
+    if not isinstance(oracle, (TokenizedOracle, CachedStringOracle)):
+        return NaiveExtendOracle(oracle)
+    if isinstance(split_oracle(oracle)[0].backend(), AsyncExternalOracle):
+        return AsyncExtendOracle(oracle)
+    if Config.oracleWorkers > 1:
+        return ParallelExtendOracle(oracle, Config.oracleWorkers, Config.oracleWorkerMode)
+    return NaiveExtendOracle(oracle)
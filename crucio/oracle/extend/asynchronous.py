@@ -0,0 +1,25 @@
+from typing import Hashable, Dict, Collection
+
+from crucio.oracle import ExtendOracle, Oracle
+from crucio.oracle.async_external import AsyncExternalOracle
+from crucio.oracle.extend.parallel import split_oracle
+
+
+class AsyncExtendOracle(ExtendOracle):
+    def __init__(self, oracle: Oracle):
+        """
+        Drive the event loop of an `AsyncExternalOracle` for a whole batch.
+        :param oracle: an AsyncExternalOracle, or a TokenizedOracle or RecordingOracle in front of one
+        """
+        self.oracle = oracle
+
+    def batch(self, items: Collection[Hashable], desc='ParseBatch') -> Dict[Hashable, bool]:
+        raw, ins = split_oracle(self.oracle)
+        backend = raw.backend()
+        assert isinstance(backend, AsyncExternalOracle)
+        sentences = {item: ins(item) for item in items}
+        answers = backend.parse_many_sync(sentences.values(), desc, raw)
+        return {item: answers[sentence] for item, sentence in sentences.items()}
+
+    def parse(self, item: Hashable) -> bool:
+        return self.oracle.parse(item)
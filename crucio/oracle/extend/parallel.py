@@ -0,0 +1,124 @@
+import atexit
+import multiprocessing
+import os
+import pickle
+import time
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Hashable, Dict, Collection, Callable, Tuple, Optional
+
+from crucio.oracle import ExtendOracle, Oracle
+from crucio.oracle.string import CachedStringOracle
+from crucio.oracle.tokenized import TokenizedOracle
+
+_worker_oracle: Optional[CachedStringOracle] = None
+
+# pools outlive the per-batch ParallelExtendOracle: thread pools are shared by all oracles,
+# a process pool holds a copy of one raw oracle and goes away with it
+_thread_pools: Dict[int, ThreadPoolExecutor] = {}
+_process_pools: "weakref.WeakKeyDictionary[CachedStringOracle, Tuple[int, ProcessPoolExecutor]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _init_worker(payload: bytes):
+    global _worker_oracle
+    _worker_oracle = pickle.loads(payload)
+
+
+def _thread_pool(workers: int) -> ThreadPoolExecutor:
+    if workers not in _thread_pools:
+        _thread_pools[workers] = ThreadPoolExecutor(workers)
+    return _thread_pools[workers]
+
+
+def _process_pool(raw: CachedStringOracle, workers: int) -> ProcessPoolExecutor:
+    """
+    started with spawn, a fork would copy the locks held by the progress bar and the store threads;
+    the oracle is pickled once, the pool keeps no reference to it
+    """
+    if raw in _process_pools:
+        size, executor = _process_pools[raw]
+        if size == workers:
+            return executor
+        executor.shutdown(wait=False)
+    executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(pickle.dumps(raw),))
+    _process_pools[raw] = (workers, executor)
+    weakref.finalize(raw, executor.shutdown, wait=False)
+    return executor
+
+
+@atexit.register
+def _shutdown_pools():
+    for executor in _thread_pools.values():
+        executor.shutdown()
+    _thread_pools.clear()
+    for _, executor in list(_process_pools.values()):
+        executor.shutdown()
+    _process_pools.clear()
+
+
+def _timed_parse(oracle: CachedStringOracle, sentence: str) -> Tuple[Optional[bool], float]:
+    start = time.time()
+    ans = oracle._parse(sentence)
+    return ans, time.time() - start
+
+
+def _parse_in_worker(sentence: str) -> Tuple[Optional[bool], float]:
+    return _timed_parse(_worker_oracle, sentence)
+
+
+def split_oracle(oracle: Oracle) -> Tuple[CachedStringOracle, Callable[[Hashable], str]]:
+    """
+    split an oracle into the cached string oracle doing the real work and the instantiation in front of it
+    """
+    if isinstance(oracle, TokenizedOracle):
+        return oracle.raw(), oracle.ins
+    if isinstance(oracle, CachedStringOracle):
+        return oracle, lambda x: x
+    raise Exception(f'Can not batch {type(oracle).__name__} in parallel')
+
+
+class ParallelExtendOracle(ExtendOracle):
+    def __init__(self, oracle: Oracle, workers: int = os.cpu_count(), mode: str = 'thread'):
+        """
+        Fan a batch out to a pool kept across batches,
+        the cache and the calls/call_time accounting stay in this process.
+        :param oracle: a TokenizedOracle or a CachedStringOracle
+        :param workers: size of the pool
+        :param mode: 'thread' for oracles waiting on subprocesses, 'process' for picklable oracles running in python
+        """
+        self.oracle = oracle
+        self.workers = workers
+        self.mode = mode
+
+    def __executor(self, raw: CachedStringOracle) -> Executor:
+        if self.mode == 'process':
+            return _process_pool(raw, self.workers)
+        return _thread_pool(self.workers)
+
+    def __submit(self, executor: Executor, raw: CachedStringOracle, sentence: str) -> Future:
+        if self.mode == 'process':
+            return executor.submit(_parse_in_worker, sentence)
+        return executor.submit(_timed_parse, raw, sentence)
+
+    def batch(self, items: Collection[Hashable], desc='ParseBatch') -> Dict[Hashable, bool]:
+        from crucio.utils.global_bar import RichBar
+        raw, ins = split_oracle(self.oracle)
+        sentences = {item: ins(item) for item in items}
+        answers = {}
+        for sentence in set(sentences.values()):
+            answers[sentence] = raw.lookup(sentence)
+        unknown = [sentence for sentence, ans in answers.items() if ans is None]
+        if len(unknown) > 0:
+            executor = self.__executor(raw)
+            futures = {self.__submit(executor, raw, sentence): sentence for sentence in unknown}
+            for future in RichBar(as_completed(futures), len(futures), desc):
+                sentence = futures[future]
+                ans, cost = future.result()
+                answers[sentence] = bool(ans)
+                raw.remember(sentence, ans, cost)
+        return {item: answers[sentence] for item, sentence in sentences.items()}
+
+    def parse(self, item: Hashable) -> bool:
+        return self.oracle.parse(item)
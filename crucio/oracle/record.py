@@ -0,0 +1,121 @@
+import atexit
+import gzip
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from crucio.oracle.string import CachedStringOracle
+
+
+class UnseenQueryError(Exception):
+    pass
+
+
+class RecordingOracle(CachedStringOracle):
+    def __init__(self, oracle: CachedStringOracle, path: str):
+        """
+        Log every query answered by `oracle` to `path` (gzip, one json [query, answer, latency] per line)
+        so the run can be replayed by `ReplayOracle` without the oracle.
+        This oracle caches, stores and attributes the answers, `oracle` only makes the calls.
+        """
+        super().__init__(oracle.store)
+        self.oracle = oracle
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__file = gzip.open(path, 'wt', encoding='utf-8')
+        atexit.register(self.close)
+
+    def _parse(self, sentence: str) -> Optional[bool]:
+        return self.oracle._parse(sentence)
+
+    def backend(self) -> CachedStringOracle:
+        return self.oracle.backend()
+
+    def stored(self, sentence: str, ans: bool):
+        # answers of a warm store are logged too, or the replay would not know them; their latency is unknown
+        self.__log(sentence, ans, 0)
+
+    def remember(self, sentence: str, ans: Optional[bool], cost: float):
+        # every path answering a query (parse, parallel and async batches) ends here, in this process
+        super().remember(sentence, ans, cost)
+        self.__log(sentence, ans, cost)
+
+    def __log(self, sentence: str, ans: Optional[bool], cost: float):
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.write(json.dumps([sentence, int(bool(ans)), round(cost, 6)], ensure_ascii=False) + '\n')
+
+    def close(self):
+        with self.__lock:
+            if self.__file is not None and not self.__file.closed:
+                self.__file.close()
+
+    def __getstate__(self):
+        # the log can not be pickled (grammar_dict is dumped by dill), an unpickled copy stops recording
+        state = self.__dict__.copy()
+        state['_RecordingOracle__file'] = None
+        state['_RecordingOracle__lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+
+class ReplayOracle(CachedStringOracle):
+    def __init__(self, path: str, simulate_latency: bool = False):
+        """
+        Answer queries from a log written by `RecordingOracle`.
+        :param simulate_latency: sleep for the recorded latency of every call
+        :raise UnseenQueryError: on a query that is not in the log
+        """
+        super().__init__()
+        self.path = path
+        self.simulate_latency = simulate_latency
+        self.records: Dict[str, Tuple[bool, float]] = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                sentence, ans, latency = json.loads(line)
+                self.records[sentence] = (bool(ans), latency)
+
+    def _parse(self, sentence: str) -> bool:
+        if sentence not in self.records:
+            raise UnseenQueryError(f'{repr(sentence)} is not in the recording {self.path}')
+        ans, latency = self.records[sentence]
+        if self.simulate_latency:
+            time.sleep(latency)
+        return ans
+
+
+if __name__ == '__main__':
+    # python -m crucio.oracle.record: record over a warm store, then replay the log without the store
+    import os
+    import tempfile
+    from crucio.oracle.store import OracleStore
+
+    class BalancedOracle(CachedStringOracle):
+        def _parse(self, sentence: str) -> bool:
+            depth = 0
+            for c in sentence:
+                depth += 1 if c == '(' else -1
+                if depth < 0:
+                    return False
+            return depth == 0
+
+    sentences = ['', '()', '(()', '(())()', ')(', '((()))', '())', '(()())']
+    with tempfile.TemporaryDirectory() as directory:
+        store = OracleStore(os.path.join(directory, 'store.db'), 'balanced')
+        warm = BalancedOracle(store)
+        for sentence in sentences[:5]:
+            warm.parse(sentence)
+        store.flush()
+        path = os.path.join(directory, 'log.gz')
+        recording = RecordingOracle(BalancedOracle(store), path)
+        expected = [recording.parse(sentence) for sentence in sentences]
+        recording.close()
+        store.close()
+        assert recording.calls == len(sentences) - 5, 'the warm store should answer the first queries'
+        replay = ReplayOracle(path)
+        assert [replay.parse(sentence) for sentence in sentences] == expected
+        print(f'replayed {len(sentences)} queries, {recording.calls} recorded calls')
@@ -0,0 +1,159 @@
+import os
+import queue
+import select
+import shlex
+import signal
+import subprocess
+import sys
+from typing import List, Optional
+
+from crucio.consts import projectPath
+from crucio.oracle.shim import write_request, ACCEPT, REJECT, TIMEOUT
+from crucio.oracle.store import OracleStore
+from crucio.oracle.string import CachedStringOracle
+from crucio.utils.statistics import counting
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class OracleWorker:
+    def __init__(self, argv: List[str], timeout: float):
+        """
+        A long-lived oracle process speaking the protocol of `crucio.oracle.shim`.
+        :param argv: command starting the process
+        :param timeout: seconds to wait for an answer before the process is considered hung
+        """
+        self.argv = argv
+        self.timeout = timeout
+        self.__proc: Optional[subprocess.Popen] = None
+
+    def start(self):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [projectPath, env.get('PYTHONPATH')]))
+        self.__proc = subprocess.Popen(self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, env=env, start_new_session=True)
+
+    def stop(self):
+        if self.__proc is None:
+            return
+        try:
+            os.killpg(self.__proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.__proc.wait()
+        self.__proc.stdin.close()
+        self.__proc.stdout.close()
+        self.__proc = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+        counting('oracle worker restarts')
+
+    def alive(self) -> bool:
+        return self.__proc is not None and self.__proc.poll() is None
+
+    def query(self, payload: bytes) -> Optional[bool]:
+        """
+        :return: None if the parser timed out
+        :raise WorkerCrashed: the process died before answering
+        :raise subprocess.TimeoutExpired: no answer within `timeout`
+        """
+        if not self.alive():
+            self.restart()
+        try:
+            write_request(self.__proc.stdin, payload)
+        except BrokenPipeError:
+            raise WorkerCrashed()
+        ready, _, _ = select.select([self.__proc.stdout], [], [], self.timeout)
+        if not ready:
+            raise subprocess.TimeoutExpired(self.argv, self.timeout)
+        answer = os.read(self.__proc.stdout.fileno(), 1)
+        if answer == ACCEPT:
+            return True
+        if answer == REJECT:
+            return False
+        if answer == TIMEOUT:
+            return None
+        raise WorkerCrashed()
+
+
+class OracleWorkerPool:
+    def __init__(self, argv: List[str], size: int = 1, timeout: float = 10):
+        self.__workers = [OracleWorker(argv, timeout) for _ in range(size)]
+        self.__idle = queue.Queue()
+        for worker in self.__workers:
+            self.__idle.put(worker)
+
+    def __len__(self):
+        return len(self.__workers)
+
+    def query(self, payload: bytes) -> Optional[bool]:
+        """
+        Thread-safe, blocks until a worker is idle.
+        A crashed worker is restarted and the query retried once, a hung worker is restarted
+        and the query answered None, as `ExternalOracle` does on timeout.
+        """
+        worker = self.__idle.get()
+        try:
+            for _ in range(2):
+                try:
+                    return worker.query(payload)
+                except WorkerCrashed:
+                    worker.restart()
+                except subprocess.TimeoutExpired:
+                    print(f"Caused timeout: {payload.decode('utf-8', errors='replace')}")
+                    worker.restart()
+                    return None
+            return False
+        finally:
+            self.__idle.put(worker)
+
+    def close(self):
+        for worker in self.__workers:
+            worker.stop()
+
+
+class ServerOracle(CachedStringOracle):
+    def __init__(self, command: str, workers: int = 1, timeout: float = 10, native: bool = False,
+                 store: Optional[OracleStore] = None):
+        """
+        Oracle served by a pool of long-lived processes instead of one process per query.
+        :param command: oracle command, as for `ExternalOracle`
+        :param workers: number of processes, concurrent callers (i.e. `ParallelExtendOracle`) use them all
+        :param timeout: seconds allowed for one parse
+        :param native: `command` speaks the protocol of `crucio.oracle.shim` itself
+        """
+        super().__init__(store)
+        self.command = command
+        self.workers = workers
+        self.timeout = timeout
+        self.native = native
+        self.__pool: Optional[OracleWorkerPool] = None
+
+    def argv(self) -> List[str]:
+        if self.native:
+            return shlex.split(self.command)
+        return [sys.executable, '-m', 'crucio.oracle.shim', '--timeout', str(self.timeout)] + \
+            shlex.split(self.command)
+
+    def pool(self) -> OracleWorkerPool:
+        if self.__pool is None:
+            # leave the shim some time to report a timeout of the wrapped parser itself
+            self.__pool = OracleWorkerPool(self.argv(), self.workers, self.timeout + 5)
+        return self.__pool
+
+    def _parse(self, sentence: str) -> Optional[bool]:
+        return self.pool().query(sentence.encode('utf-8'))
+
+    def close(self):
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_ServerOracle__pool'] = None
+        return state
@@ -0,0 +1,79 @@
+"""
+Server mode adapter for oracles taking the input file as argument:
+
+    $ python -m crucio.oracle.shim [--timeout SECONDS] <oracle command>
+
+Every request on stdin is a 4 byte big-endian length followed by the utf-8 input,
+one answer byte (`ACCEPT`, `REJECT` or `TIMEOUT`) is written to stdout per request.
+Parsers that speak this protocol natively can be used by `ServerOracle` without the shim.
+"""
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+from typing import Optional, BinaryIO
+
+from crucio.oracle.command import build_command
+
+HEADER = struct.Struct('>I')
+ACCEPT = b'1'
+REJECT = b'0'
+TIMEOUT = b'2'
+
+
+def read_exactly(stream: BinaryIO, n: int) -> Optional[bytes]:
+    data = b''
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def read_request(stream: BinaryIO) -> Optional[bytes]:
+    header = read_exactly(stream, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    return read_exactly(stream, length)
+
+
+def write_request(stream: BinaryIO, payload: bytes) -> None:
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def serve(command: str, timeout: float = 10):
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    commands = build_command(command, path)
+    try:
+        while True:
+            payload = read_request(stdin)
+            if payload is None:
+                break
+            with open(path, 'wb') as f:
+                f.write(payload)
+            try:
+                result = subprocess.run(commands, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, timeout=timeout)
+                answer = ACCEPT if result.returncode == 0 else REJECT
+            except subprocess.TimeoutExpired:
+                answer = TIMEOUT
+            stdout.write(answer)
+            stdout.flush()
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    serve(' '.join(args.command), args.timeout)
@@ -0,0 +1,125 @@
+import atexit
+import hashlib
+import os
+import shutil
+import sqlite3
+from typing import Optional, Dict
+
+from crucio.utils.statistics import hitRecorder, missRecorder, counting
+
+
+def resolve_binary(command: str) -> Optional[str]:
+    """
+    Find the file actually executed by an oracle command, so it can be checksummed.
+    :param command: command of an ExternalOracle
+    :return: path of the file, None if it can not be found
+    """
+    target = command
+    if command.startswith('java'):
+        target = command.split(' ')[1] + '.class'
+    if os.path.isfile(target):
+        return target
+    return shutil.which(target)
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def oracle_namespace(command: str) -> str:
+    """
+    namespace = oracle command + checksum of its binary, so answers of a rebuilt parser are not reused
+    """
+    binary = resolve_binary(command)
+    checksum = file_checksum(binary) if binary is not None else ''
+    return hashlib.sha256(f'{command}\0{checksum}'.encode('utf-8')).hexdigest()
+
+
+class OracleStore:
+    def __init__(self, path: str, namespace: str, batch_size: int = 256):
+        """
+        Content-hash keyed answer store backed by sqlite, new answers are written behind in batches.
+        :param path: path of the sqlite file
+        :param namespace: see `oracle_namespace`
+        :param batch_size: number of pending answers that triggers a write
+        """
+        self.path = path
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.__pending: Dict[bytes, bool] = {}
+        self.__conn: Optional[sqlite3.Connection] = None
+        atexit.register(self.flush)
+
+    @staticmethod
+    def key(sentence: str) -> bytes:
+        return hashlib.sha256(sentence.encode('utf-8')).digest()
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.__conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.__conn.execute('PRAGMA journal_mode=WAL')
+            self.__conn.execute('CREATE TABLE IF NOT EXISTS answers ('
+                                'namespace TEXT NOT NULL, '
+                                'key BLOB NOT NULL, '
+                                'answer INTEGER NOT NULL, '
+                                'PRIMARY KEY (namespace, key)) WITHOUT ROWID')
+            self.__conn.commit()
+        return self.__conn
+
+    def get(self, sentence: str) -> Optional[bool]:
+        key = self.key(sentence)
+        if key in self.__pending:
+            hitRecorder('oracle store')
+            return self.__pending[key]
+        row = self.__connect().execute('SELECT answer FROM answers WHERE namespace = ? AND key = ?',
+                                       (self.namespace, key)).fetchone()
+        if row is None:
+            missRecorder('oracle store')
+            return None
+        hitRecorder('oracle store')
+        return bool(row[0])
+
+    def put(self, sentence: str, answer: bool) -> None:
+        self.__pending[self.key(sentence)] = answer
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self.__pending) == 0:
+            return
+        conn = self.__connect()
+        conn.executemany('INSERT OR REPLACE INTO answers (namespace, key, answer) VALUES (?, ?, ?)',
+                         [(self.namespace, k, int(v)) for k, v in self.__pending.items()])
+        conn.commit()
+        counting('oracle store writes', len(self.__pending))
+        self.__pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        if self.__conn is not None:
+            self.__conn.close()
+            self.__conn = None
+
+    def __len__(self):
+        row = self.__connect().execute('SELECT COUNT(*) FROM answers WHERE namespace = ?',
+                                       (self.namespace,)).fetchone()
+        return row[0]
+
+    def __getstate__(self):
+        # the connection can not be pickled (grammar_dict is dumped by dill), reconnect lazily
+        self.flush()
+        state = self.__dict__.copy()
+        state['_OracleStore__conn'] = None
+        state['_OracleStore__pending'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        atexit.register(self.flush)
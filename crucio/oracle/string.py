@@ -1,12 +1,17 @@
 import time
 from abc import abstractmethod
 import subprocess
-import tempfile
+from typing import Optional, Union
 
 import lark
 
+from crucio.config import Config
 from crucio.oracle import StringOracle
-from crucio.utils.statistics import counter, timer
+from crucio.oracle.cache import CacheTier
+from crucio.oracle.channel import InputChannel, FileChannel, get_channel
+from crucio.oracle.command import build_command
+from crucio.oracle.store import OracleStore
+from crucio.utils.statistics import counter, timer, phaseLocal, phaseCall
 
 import os
 
@@ -14,41 +19,106 @@ os.environ['CLASSPATH'] = './:/opt/homebrew/opt/antlr/antlr-4.13.2-complete.jar'
 
 
 class CachedStringOracle(StringOracle):
-    def __init__(self):
+    # queries and calls are attributed to the active `phase`
+    profiled = True
+    # oracles pickled before the answer store was added have no `store`
+    store: Optional[OracleStore] = None
+
+    def __init__(self, store: Optional[OracleStore] = None):
         self.calls = 0
         self.call_time = 0
-        self.cache = {}
+        self.cache = CacheTier(f'{type(self).__name__} cache', max_negatives=Config.oracleCacheNegatives)
+        self.store = store
 
     def parse(self, sentence: str) -> bool:
-        if sentence in self.cache:
-            return self.cache[sentence]
-        self.calls += 1
+        ans = self.lookup(sentence)
+        if ans is not None:
+            return ans
         start = time.time()
         ans = self._parse(sentence)
-        self.call_time += time.time() - start
-        self.cache[sentence] = ans
+        self.remember(sentence, ans, time.time() - start)
+        return bool(ans)
+
+    def lookup(self, sentence: str) -> Optional[bool]:
+        """
+        answer known without calling the oracle, None if unknown
+        """
+        ans = self.cache.lookup(sentence)
+        if ans is None and self.store is not None:
+            ans = self.store.get(sentence)
+            if ans is not None:
+                self.cache[sentence] = ans
+                self.stored(sentence, ans)
+        if self.profiled:
+            # counted per thread, credited to the phase when the phase stack changes
+            phaseLocal.queries += 1
+            if ans is not None:
+                phaseLocal.hits += 1
         return ans
 
+    def stored(self, sentence: str, ans: bool):
+        """
+        `sentence` was answered by the store, no oracle call was made
+        """
+        pass
+
+    def remember(self, sentence: str, ans: Optional[bool], cost: float):
+        """
+        account an oracle call made for `sentence`, possibly outside of `parse`
+        :param ans: None if the call gave no answer (timeout), rejected for this run but not persisted
+        """
+        self.calls += 1
+        self.call_time += cost
+        if self.profiled:
+            phaseCall(cost)
+        self.cache[sentence] = bool(ans)
+        if self.store is not None and ans is not None:
+            self.store.put(sentence, ans)
+
     @abstractmethod
-    def _parse(self, sentence: str) -> bool:
+    def _parse(self, sentence: str) -> Optional[bool]:
+        """
+        :return: None if the oracle gave no answer in time
+        """
         pass
 
+    def backend(self) -> "CachedStringOracle":
+        """
+        the oracle making the calls, differs from this one for wrappers such as RecordingOracle
+        """
+        return self
+
     def record(self, oracle: "CachedStringOracle"):
         self.calls += oracle.calls
         self.call_time += oracle.call_time
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # oracles pickled before the cache tiers carry a plain dict
+        if isinstance(self.cache, dict):
+            cache = CacheTier(f'{type(self).__name__} cache', max_negatives=Config.oracleCacheNegatives)
+            cache.update(self.cache)
+            self.cache = cache
+
 
 class ExternalOracle(CachedStringOracle):
-    def __init__(self, command):
+    # oracles pickled before input channels were added have no `channel`
+    channel: InputChannel = FileChannel()
+
+    def __init__(self, command, store: Optional[OracleStore] = None, channel: Union[str, InputChannel] = 'file'):
         """
         `command` is a string representing the oracle command, i.e. `command` = "readpng"
         in the oracle call:
             $ readpng <MY_FILE>
+        `store` optionally persists answers across runs, see `crucio.oracle.store`.
+        `channel` is how the input reaches the oracle: 'file', 'stdin', 'memfd' or 'tmpfs',
+        see `crucio.oracle.channel`.
         """
-        super().__init__()
+        super().__init__(store)
         self.command = command
+        self.channel = get_channel(channel)
 
-    def _parse(self, sentence: str) -> bool:
+    def _parse(self, sentence: str) -> Optional[bool]:
         return self.__parse_internal(sentence)
 
     def __parse_internal(self, string):
@@ -56,41 +126,25 @@ class ExternalOracle(CachedStringOracle):
         Does the work of calling the subprocess.
         """
         # print(string)
-        FNULL = open(os.devnull, 'w')
-        f = tempfile.NamedTemporaryFile()
-        f.write(bytes(string, 'utf-8'))
-        f_name = f.name
-        f.flush()
+        prepared = self.channel.prepare(bytes(string, 'utf-8'))
         try:
             # With check = True, throws a CalledProcessError if the exit code is non-zero
-            command = ''
-            op1 = self.command
-            if self.command.endswith('.sh'):
-                command = 'bash'
-            elif self.command.endswith('.py'):
-                command = 'python3'
-            elif self.command.startswith('java'):
-                command = 'java'
-                op1 = self.command.split(' ')[1]
-            commands = [command, op1, f_name]
-            if commands[0] == '':
-                commands = commands[1:]
-            subprocess.run(commands, stdout=FNULL, stderr=FNULL, check=True, timeout=10)
-            f.close()
-            FNULL.close()
+            commands = build_command(self.command, prepared.path)
+            subprocess.run(commands, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=10,
+                           **prepared.run_kwargs())
             return True
         except subprocess.CalledProcessError as e:
-            f.close()
-            FNULL.close()
             return False
         except subprocess.TimeoutExpired as e:
             print(f"Caused timeout: {string}")
-            f.close()
-            FNULL.close()
-            return False
+            return None
+        finally:
+            prepared.release()
 
 
 class LarkOracle(CachedStringOracle):
+    profiled = False
+
     @timer('LarkOracle build')
     def __init__(self, *args, **kwargs) -> None:
         super().__init__()
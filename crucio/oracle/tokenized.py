@@ -4,10 +4,11 @@ from typing import Union, Optional
 import dill
 
 from crucio.instantiate.TokenIns import TokenInstantiator
-from crucio.oracle import TokenOracle
+from crucio.oracle import TokenOracle, ExtendOracle
+from crucio.oracle.cache import OracleCache, CacheTier
 from crucio.oracle.string import CachedStringOracle
-from crucio.tokenize import Tokens
-from crucio.utils.statistics import counter, timer
+from crucio.tokenize import Tokens, TokenInterner
+from crucio.utils.statistics import counter, timer, phaseLocal
 
 dill.settings['recurse'] = True
 
@@ -17,9 +18,14 @@ class TokenizedOracle(TokenOracle):
         return self._oracle
 
     @timer('TokenizedOracle build')
-    def __init__(self, rawOracle: CachedStringOracle, tokenInstantiator: TokenInstantiator):
+    def __init__(self, rawOracle: CachedStringOracle, tokenInstantiator: TokenInstantiator,
+                 cache: Optional[OracleCache] = None):
+        """
+        :param cache: answers token sequences seen before without instantiating them
+        """
         self._ti: Optional[TokenInstantiator] = tokenInstantiator
         self._oracle = rawOracle
+        self._cache = cache
 
     def ins(self, x):
         return self._ti.instantiate(x)
@@ -29,44 +35,87 @@ class TokenizedOracle(TokenOracle):
 
     @counter('TokenizedOracle')
     def parse(self, tokens: Union[Tokens]) -> bool:
-        return self._oracle.parse(self._ti.instantiate(tokens))
+        if self._cache is None:
+            return self._oracle.parse(self._ti.instantiate(tokens))
+        ans = self._cache.lookup(tokens)
+        if ans is None:
+            ans = self._oracle.parse(self._ti.instantiate(tokens))
+            self._cache.remember(tokens, ans)
+        elif self._oracle.profiled:
+            phaseLocal.queries += 1
+            phaseLocal.hits += 1
+        return ans
 
 
 class CachedTokenOracle(TokenOracle):
     def __init__(self, oracle: TokenOracle):
         self.oracle = oracle
-        self.cache = {}
+        # tokens compare by type
+        self.interner = TokenInterner(with_values=False)
+        self.cache = CacheTier('CachedTokenOracle cache', self.interner.key)
+        # key -> the first positive sequence with this key, keys do not keep the token values
+        self.positives: Dict[bytes, Tokens] = {}
 
     def update_oracle(self, oracle: TokenOracle):
         self.oracle = oracle
 
+    def __remember(self, tokens: Tokens, ans: bool):
+        self.cache[tokens] = ans
+        if ans:
+            self.positives.setdefault(self.interner.key(tokens), tokens)
+
     def parse(self, tokens: Tokens) -> bool:
-        if tokens not in self.cache:
-            self.cache[tokens] = self.oracle.parse(tokens)
-        return self.cache[tokens]
+        ans = self.cache.lookup(tokens)
+        if ans is None:
+            ans = self.oracle.parse(tokens)
+            self.__remember(tokens, ans)
+        return ans
 
     def get_positives(self):
-        return {k for k, v in self.cache.items() if v}
+        return set(self.positives.values())
 
     def update_cache(self, cache: Dict):
-        self.cache.update(cache)
+        for tokens, ans in cache.items():
+            self.__remember(tokens, ans)
 
 
 class IncrementalOracle(TokenOracle):
     def __init__(self, oracle: TokenOracle):
         self.oracle = oracle
-        self.cache = set()
+        # only positives, the grammar behind `oracle` grows
+        self.interner = TokenInterner(with_values=False)
+        self.cache = CacheTier('IncrementalOracle cache', self.interner.key, max_negatives=0)
 
     def update_oracle(self, oracle: TokenOracle):
         self.oracle = oracle
 
     def parse(self, tokens: Tokens) -> bool:
-        if tokens in self.cache:
+        if self.cache.lookup(tokens):
             return True
         ans = self.oracle.parse(tokens)
         if ans:
             self.cache.add(tokens)
         return ans
 
+    def batch(self, items: Collection[Tokens]) -> Dict[Tokens, bool]:
+        """
+        answers of several sequences, the unknown ones in one batch when the oracle supports it
+        """
+        answers = {}
+        unknown = []
+        for tokens in items:
+            if self.cache.lookup(tokens):
+                answers[tokens] = True
+            else:
+                unknown.append(tokens)
+        if len(unknown) > 0:
+            if isinstance(self.oracle, ExtendOracle):
+                found = self.oracle.batch(unknown)
+            else:
+                found = {tokens: self.oracle.parse(tokens) for tokens in unknown}
+            self.cache.update([tokens for tokens, ans in found.items() if ans])
+            answers.update(found)
+        return answers
+
     def update_cache(self, cache: Collection):
         self.cache.update(cache)
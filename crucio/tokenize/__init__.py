@@ -1,14 +1,41 @@
 from abc import abstractmethod
+from array import array
 from dataclasses import dataclass
-from typing import Collection, Tuple
+from typing import Collection, Tuple, Dict, Hashable, List
 from crucio.config import Config
 from crucio.utils import str1
 
 
+# token type -> small int, shared by every Token of the run
+type_codes: Dict[Hashable, int] = {}
+token_types: List[Hashable] = []
+
+
+def type_code(ttype) -> int:
+    code = type_codes.get(ttype)
+    if code is None:
+        code = len(token_types)
+        type_codes[ttype] = code
+        token_types.append(ttype)
+    return code
+
+
+def code_array(codes) -> array:
+    """
+    codes as array('H'), or array('I') once there are more than 65536 of them
+    """
+    codes = list(codes)
+    return array('H' if len(token_types) <= 0x10000 else 'I', codes)
+
+
 class Token:
+    __slots__ = ('__type', '__value', '__code', '__hash')
+
     def __init__(self, ttype, value=None) -> None:
         self.__type = ttype
         self.__value = value
+        self.__code = type_code(ttype)
+        self.__hash = hash(ttype)
 
     @property
     def type(self):
@@ -18,6 +45,13 @@ class Token:
     def value(self):
         return self.__value
 
+    @property
+    def code(self) -> int:
+        """
+        the interned id of the type, tokens are equal iff their codes are
+        """
+        return self.__code
+
     def __str__(self):
         return self.type
 
@@ -28,15 +62,85 @@ class Token:
         return 'Token(%s,%s)' % (repr(self.type), repr(self.value))
 
     def __hash__(self) -> int:
-        return hash(self.__type)
+        return self.__hash
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Token):
             return False
-        return self.__type == other.__type
+        return self.__code == other.__code
+
+    def __reduce__(self):
+        return Token, (self.__type, self.__value)
+
+    def __setstate__(self, state):
+        # pickles written before Token had slots carry the attribute dict
+        if isinstance(state, tuple):
+            state = state[1]
+        self.__init__(state['_Token__type'], state.get('_Token__value'))
 
 
 Tokens = Tuple[Token, ...]
+# marks an id that does not fit in the 16 bits of a TokenInterner key word
+ESCAPE = 0xFFFF
+
+
+class TokenInterner:
+    def __init__(self, with_values: bool = True):
+        """
+        Maps tokens to small ids so that a token sequence can be keyed by a compact bytes object.
+        Each instance owns its table, keys of different interners are not comparable, except that
+        interners without values all use the global type codes `Token.code`.
+        :param with_values: tokens are distinguished by (type, value), otherwise by type as in `Token.__eq__`
+        """
+        self.with_values = with_values
+        self.ids: Dict[Hashable, int] = {}
+        self.table: List[Hashable] = []
+
+    def id(self, token: Token) -> int:
+        if not self.with_values:
+            return token.code
+        k = (token.type, token.value)
+        i = self.ids.get(k)
+        if i is None:
+            i = len(self.table)
+            self.ids[k] = i
+            self.table.append(k)
+        return i
+
+    def key(self, tokens: Tokens) -> bytes:
+        """
+        16 bit ids, an id >= ESCAPE takes three words: ESCAPE, high and low half.
+        The key of a sequence only depends on its own ids, not on the size of the table
+        """
+        ids = [self.id(token) for token in tokens]
+        if len(ids) == 0 or max(ids) < ESCAPE:
+            return array('H', ids).tobytes()
+        words = array('H')
+        for i in ids:
+            if i < ESCAPE:
+                words.append(i)
+            else:
+                words.extend((ESCAPE, i >> 16, i & 0xFFFF))
+        return words.tobytes()
+
+    def decode(self, key: bytes) -> Tokens:
+        words = array('H')
+        words.frombytes(key)
+        ids = []
+        k = 0
+        while k < len(words):
+            if words[k] == ESCAPE:
+                ids.append(words[k + 1] << 16 | words[k + 2])
+                k += 3
+            else:
+                ids.append(words[k])
+                k += 1
+        if self.with_values:
+            return tuple(Token(*self.table[i]) for i in ids)
+        return tuple(Token(token_types[i]) for i in ids)
+
+    def __len__(self):
+        return len(self.table) if self.with_values else len(token_types)
 
 
 class SupportAssembly:
@@ -65,7 +169,7 @@ class TokenizedContext(SupportAssembly):
         return self.__suffix
 
     def __str__(self):
-        return str1(self.__prefix + ('s', 's') + self.__suffix)
+        return str1(self.getPrefix() + ('s', 's') + self.getSuffix())
 
     def __repr__(self):
         return str(self)
@@ -74,7 +178,7 @@ class TokenizedContext(SupportAssembly):
         return hash((self.__prefix, self.__suffix))
 
     def __eq__(self, other):
-        return isinstance(other,TokenizedContext) and self.__suffix == other.__suffix and self.__prefix == other.__prefix
+        return isinstance(other,TokenizedContext) and self.getSuffix() == other.getSuffix() and self.getPrefix() == other.getPrefix()
 
 
 class Tokenizer:
@@ -0,0 +1,230 @@
+"""
+Substrings and contexts of examples as (example id, left, right) spans instead of copied token tuples.
+Spans hash and compare by token content, so equal spans of different examples collide.
+They never compare equal to plain token tuples or contexts, the two kinds are not mixed in one set or dict.
+Tokens are materialised only when a span is assembled into a query.
+Each inference run interns into its own table (see reset_examples), spans keep the table they were made in.
+"""
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from crucio.tokenize import Tokens, TokenizedContext, code_array
+
+MOD = (1 << 61) - 1
+BASE = 1_000_003
+
+
+class ExampleTable:
+    def __init__(self):
+        self.examples: List[Tokens] = []
+        self.__ids: Dict[Tokens, int] = {}
+        self.__by_identity: Dict[int, int] = {}
+        # type codes of each example, equal codes iff equal tokens
+        self.codes: List[array] = []
+        self.__hashes: List[List[int]] = []
+        self.__powers = [1]
+        # balance indexes of examples, keyed by (example id, balance mode), see balance_index
+        self.balance: Dict[Tuple[int, str], object] = {}
+
+    def intern(self, example: Tokens) -> int:
+        eid = self.__by_identity.get(id(example))
+        if eid is not None and self.examples[eid] is example:
+            return eid
+        example = tuple(example)
+        eid = self.__ids.get(example)
+        if eid is None:
+            eid = len(self.examples)
+            self.examples.append(example)
+            self.__ids[example] = eid
+            self.codes.append(code_array(token.code for token in example))
+            self.__hashes.append(self.__prefix_hashes(self.codes[eid]))
+        # only the interned tuple is kept alive, so only its id can not be reused
+        if self.examples[eid] is example:
+            self.__by_identity[id(example)] = eid
+        return eid
+
+    def __prefix_hashes(self, codes: array) -> List[int]:
+        h = [0]
+        for code in codes:
+            h.append((h[-1] * BASE + code + 1) % MOD)
+        while len(self.__powers) <= len(codes):
+            self.__powers.append(self.__powers[-1] * BASE % MOD)
+        return h
+
+    def hash(self, eid: int, left: int, right: int) -> int:
+        """
+        polynomial hash of the tokens in [left, right) of example `eid`, O(1)
+        """
+        h = self.__hashes[eid]
+        return (h[right] - h[left] * self.__powers[right - left]) % MOD
+
+    def same(self, eid1: int, l1: int, r1: int, eid2: int, l2: int, r2: int,
+             other: Optional["ExampleTable"] = None) -> bool:
+        """
+        whether two spans have equal tokens, compared on the code arrays
+        the second span is in `other` if given
+        """
+        other = self if other is None else other
+        return r1 - l1 == r2 - l2 and self.codes[eid1][l1:r1] == other.codes[eid2][l2:r2]
+
+    def numpy(self, eid: int) -> np.ndarray:
+        """
+        the type codes of example `eid` as an int array, shares memory with `codes`
+        """
+        codes = self.codes[eid]
+        return np.frombuffer(codes, dtype=np.uint16 if codes.typecode == 'H' else np.uint32)
+
+    def __len__(self):
+        return len(self.examples)
+
+
+_examples = ExampleTable()
+
+
+def example_table() -> ExampleTable:
+    """
+    the table of the current inference run
+    """
+    return _examples
+
+
+def reset_examples() -> ExampleTable:
+    """
+    start a new table for an inference run, spans of earlier runs keep theirs
+    the old table and its balance indexes are freed with the last span referring to them
+    """
+    global _examples
+    _examples = ExampleTable()
+    return _examples
+
+
+class Span:
+    __slots__ = ('eid', 'left', 'right', 'table', '_hash')
+
+    def __init__(self, eid: int, left: int, right: int, table: Optional[ExampleTable] = None):
+        self.eid = eid
+        self.left = left
+        self.right = right
+        self.table = _examples if table is None else table
+        self._hash = None
+
+    @staticmethod
+    def of(example: Tokens, left: int, right: int) -> "Span":
+        table = example_table()
+        return Span(table.intern(example), left, right, table)
+
+    def example(self) -> Tokens:
+        return self.table.examples[self.eid]
+
+    def tokens(self) -> Tokens:
+        return self.example()[self.left:self.right]
+
+    def __len__(self):
+        return self.right - self.left
+
+    def __iter__(self):
+        example = self.example()
+        for i in range(self.left, self.right):
+            yield example[i]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.tokens()[item]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError(item)
+        return self.example()[self.left + item]
+
+    def __add__(self, other):
+        return self.tokens() + tuple(other)
+
+    def __radd__(self, other):
+        return tuple(other) + self.tokens()
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((len(self), self.table.hash(self.eid, self.left, self.right)))
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Span):
+            return False
+        if self.table is other.table and self.eid == other.eid and \
+                self.left == other.left and self.right == other.right:
+            return True
+        return len(self) == len(other) and hash(self) == hash(other) and \
+            self.table.same(self.eid, self.left, self.right, other.eid, other.left, other.right, other.table)
+
+    def __str__(self):
+        return str(self.tokens())
+
+    def __repr__(self):
+        return repr(self.tokens())
+
+    def __reduce__(self):
+        # ids are only meaningful in this process
+        return Span.of, (self.tokens(), 0, len(self))
+
+
+class SpanContext(TokenizedContext):
+    """
+    the context of [left, right) in example `eid`
+    """
+    __slots__ = ('eid', 'left', 'right', 'table', '_hash')
+
+    def __init__(self, eid: int, left: int, right: int, table: Optional[ExampleTable] = None):
+        self.eid = eid
+        self.left = left
+        self.right = right
+        self.table = _examples if table is None else table
+        self._hash = None
+
+    @staticmethod
+    def of(example: Tokens, left: int, right: int) -> "SpanContext":
+        table = example_table()
+        return SpanContext(table.intern(example), left, right, table)
+
+    def __example(self) -> Tokens:
+        return self.table.examples[self.eid]
+
+    def getPrefix(self) -> Tokens:
+        return self.__example()[:self.left]
+
+    def getSuffix(self) -> Tokens:
+        return self.__example()[self.right:]
+
+    def assembly(self, value: Tokens) -> Tokens:
+        example = self.__example()
+        return example[:self.left] + tuple(value) + example[self.right:]
+
+    def __len__(self):
+        return len(self.__example()) - (self.right - self.left)
+
+    def __bounds(self) -> Tuple[int, int]:
+        return self.left, len(self.__example()) - self.right
+
+    def __hash__(self):
+        if self._hash is None:
+            n = len(self.__example())
+            self._hash = hash((self.left, self.table.hash(self.eid, 0, self.left),
+                               n - self.right, self.table.hash(self.eid, self.right, n)))
+        return self._hash
+
+    def __eq__(self, other):
+        # also answers TokenizedContext == SpanContext, the reflected method of a subclass goes first
+        if not isinstance(other, SpanContext):
+            return False
+        if self.table is other.table and self.eid == other.eid and \
+                self.left == other.left and self.right == other.right:
+            return True
+        if self.__bounds() != other.__bounds() or hash(self) != hash(other):
+            return False
+        n, m = len(self.__example()), len(other.__example())
+        return self.table.same(self.eid, 0, self.left, other.eid, 0, other.left, other.table) and \
+            self.table.same(self.eid, self.right, n, other.eid, other.right, m, other.table)
+
+    def __reduce__(self):
+        return SpanContext.of, (self.__example(), self.left, self.right)
@@ -1,3 +1,6 @@
+import json
+import math
+import threading
 import time
 
 from crucio.consts import SEP
@@ -101,6 +104,103 @@ def getHitRate(name):
     return hits.get(name, 0) / (hits.get(name, 0) + misses.get(name, 0))
 
 
+phases = {}
+phaseLock = threading.Lock()
+
+
+class PhaseLocal(threading.local):
+    def __init__(self):
+        # every thread has its own stack of phases, queries of a thread outside any phase are unattributed
+        self.stack = []
+        # queries counted by the oracles of this thread since its stack last changed, see phaseFlush
+        self.queries = 0
+        self.hits = 0
+
+
+phaseLocal = PhaseLocal()
+
+
+def phaseStack():
+    return phaseLocal.stack
+
+
+def phaseFlush():
+    """
+    credit the queries counted by this thread to its current phase
+    """
+    local = phaseLocal
+    if local.queries:
+        with phaseLock:
+            rec = phaseRecord(currentPhase())
+            rec['queries'] += local.queries
+            rec['hits'] += local.hits
+        local.queries = local.hits = 0
+
+
+def phaseRecord(name):
+    if name not in phases:
+        phases[name] = {'entered': 0, 'time': 0, 'queries': 0, 'hits': 0, 'calls': 0, 'call_time': 0,
+                        'latency': {}}
+    return phases[name]
+
+
+def currentPhase():
+    stack = phaseStack()
+    return stack[-1][0] if stack else 'unattributed'
+
+
+class phase:
+    """
+    Tag the oracle queries made inside it with `name`, as a context manager or a decorator.
+    Phases nest, a query is attributed to the innermost one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        phaseFlush()
+        phaseStack().append((self.name, time.time()))
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        phaseFlush()
+        stack = phaseStack()
+        name, start = stack.pop()
+        with phaseLock:
+            rec = phaseRecord(name)
+            rec['entered'] += 1
+            # a recursive phase is timed by its outermost entry only
+            if all(i[0] != name for i in stack):
+                rec['time'] += time.time() - start
+
+    def __call__(self, func):
+        def wrapper(*args, **kwargs):
+            with phase(self.name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def phaseCall(latency):
+    # bucket e holds the latencies in [2^e, 2^(e+1)) seconds
+    bucket = math.floor(math.log2(latency)) if latency > 0 else -30
+    with phaseLock:
+        rec = phaseRecord(currentPhase())
+        rec['calls'] += 1
+        rec['call_time'] += latency
+        rec['latency'][bucket] = rec['latency'].get(bucket, 0) + 1
+
+
+def dumpPhases(path):
+    phaseFlush()
+    report = {}
+    for name, rec in phases.items():
+        report[name] = dict(rec)
+        report[name]['latency'] = {f'2^{k}': v for k, v in sorted(rec['latency'].items())}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
 def showStatistics():
     print(SEP)
     print(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time())))
@@ -121,6 +221,11 @@ def showStatistics():
         total = hitCount + missCount
         hitRate = (hitCount / total * 100) if total > 0 else 100
         print(f"{k:<25}: {hitRate:.2f}% (hits: {hitCount}, misses: {missCount})")
+
+    print('\nPhases:')
+    for k, rec in sorted(phases.items(), key=lambda x: -x[1]['calls']):
+        print(f"{k:<25}: {rec['calls']} calls, {rec['call_time']:.2f}s in oracle, {rec['time']:.2f}s total "
+              f"(queries: {rec['queries']}, hits: {rec['hits']})")
     print(SEP)
 
 
@@ -1,10 +1,10 @@
 from typing import Collection
 
 from crucio.config import Config
-from crucio.grammar_tool import checkBalance
+from crucio.grammar_tool.balance import balance_index
 
 from crucio.tokenize import Tokens, TokenizedContext
-from crucio.utils.subseq import SubSeqIterator
+from crucio.tokenize.span import Span, SpanContext, example_table
 
 
 def Subs(examples: Collection[Tokens]):
@@ -24,13 +24,10 @@ def SubsK(examples: Collection[Tokens], k):
 
 
 def Sub(tokens: Tokens):
-    ssi = SubSeqIterator(tokens)
-    ret = set()
-    for left, right in ssi:
-        if not checkBalance(tokens[left:right]):
-            continue
-        ret.add(tokens[left:right])
-    return ret
+    table = example_table()
+    eid = table.intern(tokens)
+    ls, rs = balance_index(tokens, table).balancedSpanArrays()
+    return {Span(eid, left, right, table) for left, right in zip(ls.tolist(), rs.tolist())}
 
 
 def Cons(examples: Collection[Tokens]):
@@ -50,10 +47,7 @@ def ConsK(examples: Collection[Tokens], k):
 
 
 def Con(tokens: Tokens):
-    ssi = SubSeqIterator(tokens)
-    ret = set()
-    for left, right in ssi:
-        if not checkBalance(tokens[left:right]):
-            continue
-        ret.add(TokenizedContext(tokens[:left], tokens[right:]))
-    return ret
+    table = example_table()
+    eid = table.intern(tokens)
+    ls, rs = balance_index(tokens, table).balancedSpanArrays()
+    return {SpanContext(eid, left, right, table) for left, right in zip(ls.tolist(), rs.tolist())}
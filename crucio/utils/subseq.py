@@ -1,5 +1,5 @@
-import itertools
-from typing import Sequence
+from bisect import bisect_right, insort
+from typing import Sequence, Union, Iterator, Tuple, Optional, List
 
 from crucio.config import Config
 
@@ -14,26 +14,61 @@ def intervals_overlap(interval1, interval2):
     return not (b <= c or d <= a)
 
 
+class SkipSet:
+    """
+    disjoint skipped intervals, sorted by position
+    """
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def add(self, l: int, r: int):
+        insort(self.starts, l)
+        insort(self.ends, r)
+
+    def blocker(self, l: int, r: int) -> Optional[int]:
+        """
+        the end of the first skipped interval overlapping [l, r), None if there is none
+        """
+        i = bisect_right(self.ends, l)
+        if i < len(self.ends) and self.starts[i] < r:
+            return self.ends[i]
+        return None
+
+
 class SubSeqIterator:
-    def __init__(self, seq: Sequence):
-        self.__seq = seq
+    def __init__(self, seq: Union[Sequence, int]):
+        """
+        (l, r) of all non-empty sub sequences ordered by length, longest first unless Config.reverse,
+        then by l. After skip() no later span overlaps the span yielded last.
+        :param seq: the sequence or its length
+        """
+        self.__n = seq if isinstance(seq, int) else len(seq)
         self.__skip = False
 
-    def __iter__(self):
-        skipInt = []
-        for l, r in sorted(itertools.combinations(range(len(self.__seq) + 1), 2), key=lambda x: x[0] - x[1],
-                           reverse=Config.reverse):
-            overlap = False
-            for l1, r1 in skipInt:
-                if intervals_overlap((l, r), (l1, r1)):
-                    overlap = True
-                    break
-            if overlap:
-                continue
-            yield l,r
-            if self.__skip:
-                skipInt.append((l, r))
-                self.__skip = False
+    def lengths(self) -> Sequence[int]:
+        if Config.reverse:
+            return range(1, self.__n + 1)
+        return range(self.__n, 0, -1)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        skipped = SkipSet()
+        for length in self.lengths():
+            l = 0
+            while l + length <= self.__n:
+                end = skipped.blocker(l, l + length)
+                if end is not None:
+                    # every span starting before the end of the skipped interval overlaps it
+                    l = end
+                    continue
+                yield l, l + length
+                if self.__skip:
+                    skipped.add(l, l + length)
+                    self.__skip = False
+                    l += length
+                    continue
+                l += 1
 
     def skip(self):
         self.__skip = True
@@ -4,6 +4,7 @@ from crucio.dataset.dataload import MultiFileDataLoader
 from crucio.evaluate.evaluate_mutate import evaluateGrammarPm2
 from crucio.utils.global_bar import stop
 from crucio.utils.log import terminal
+from crucio.utils.statistics import dumpPhases
 
 if __name__ == '__main__':
     import argparse
@@ -23,4 +24,5 @@ if __name__ == '__main__':
     print(evaluation)
     with open(f'{args.log_path}.eval','w') as f:
         print(evaluation,file=f)
+    dumpPhases(f'{args.log_path}.eval.profile.json')
     stop()
\ No newline at end of file
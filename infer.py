@@ -3,10 +3,14 @@ from typing import List
 
 from crucio.config import Config
 from crucio.dataset.dataload import MultiFileDataLoader
+from crucio.oracle.store import OracleStore, oracle_namespace
+from crucio.oracle.async_external import AsyncExternalOracle
+from crucio.oracle.record import RecordingOracle, ReplayOracle
+from crucio.oracle.server import ServerOracle
 from crucio.oracle.string import ExternalOracle, CachedStringOracle
 from crucio.utils.global_bar import stop, rqdm
 from crucio.utils.log import dummy
-from crucio.utils.statistics import showStatistics
+from crucio.utils.statistics import showStatistics, dumpPhases
 from learn import run_crucio3
 from monitor import initial_monitor
 
@@ -15,8 +19,26 @@ def validate_oracle(oracle: CachedStringOracle, examples: List[str]):
         if not oracle.parse(example):
             raise Exception(f'{example} does not accepted by oracle')
 
-def infer_cfg(parser_path,train_path,log_path, logger=dummy):
-    oracle = ExternalOracle(parser_path)
+def infer_cfg(parser_path,train_path,log_path, logger=dummy, store_path=None, server=0, native=False,
+              concurrency=0, record_path=None, replay_path=None, simulate_latency=False, channel='file'):
+    if channel != 'file' and (replay_path is not None or server > 0 or concurrency > 0):
+        raise Exception(f'--channel {channel} only applies to the default ExternalOracle, '
+                        f'not with --replay, --server or --concurrency')
+    if store_path is not None and replay_path is not None:
+        raise Exception('--store does not apply with --replay, the recording answers every query')
+    store = None
+    if store_path is not None:
+        store = OracleStore(store_path, oracle_namespace(parser_path))
+    if replay_path is not None:
+        oracle = ReplayOracle(replay_path, simulate_latency)
+    elif server > 0:
+        oracle = ServerOracle(parser_path, server, native=native, store=store)
+    elif concurrency > 0:
+        oracle = AsyncExternalOracle(parser_path, concurrency, store=store)
+    else:
+        oracle = ExternalOracle(parser_path, store, channel)
+    if record_path is not None:
+        oracle = RecordingOracle(oracle, record_path)
     dl = MultiFileDataLoader()
     train_set = dl.load(train_path)
     if len(train_set) == 0:
@@ -44,6 +66,14 @@ def infer_cfg(parser_path,train_path,log_path, logger=dummy):
     import dill
     with open(f'{log_path}.gramdict','wb') as f:
         dill.dump(grammar_dict,f)
+    dumpPhases(f'{log_path}.profile.json')
+    if store is not None:
+        store.close()
+    if isinstance(oracle, RecordingOracle):
+        oracle.close()
+        oracle = oracle.oracle
+    if isinstance(oracle, ServerOracle):
+        oracle.close()
 
 if __name__ == '__main__':
     import argparse
@@ -53,9 +83,30 @@ if __name__ == '__main__':
     parser.add_argument('train_path')
     parser.add_argument('log_path')
     parser.add_argument('--char', action='store_true')
+    parser.add_argument('--store', default=None, help='sqlite file caching oracle answers across runs')
+    parser.add_argument('--server', type=int, default=0, help='number of long-lived oracle worker processes')
+    parser.add_argument('--native', action='store_true', help='the oracle speaks the worker protocol itself')
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help='overlap this many oracle processes on an event loop, with adaptive timeouts')
+    parser.add_argument('--record', default=None, help='log every oracle query and answer to this file')
+    parser.add_argument('--replay', default=None, help='answer oracle queries from a --record log instead')
+    parser.add_argument('--simulate-latency', action='store_true', help='sleep for the recorded latencies on replay')
+    parser.add_argument('--channel', default='file', choices=['file', 'stdin', 'memfd', 'tmpfs'],
+                        help='how the input reaches the oracle')
+    parser.add_argument('--lazy-dm', action='store_true',
+                        help='query distributional matrix cells only when they are read')
+    parser.add_argument('--workers', type=int, default=0, help='parse oracle batches with this many workers')
+    parser.add_argument('--processes', action='store_true', help='use worker processes instead of threads')
     args = parser.parse_args()
     Config.realInfer = True
+    Config.oracleWorkers = args.workers
+    Config.lazyDM = args.lazy_dm
+    if args.processes:
+        Config.oracleWorkerMode = 'process'
     initial_monitor()
-    infer_cfg(args.parser_path, args.train_path, args.log_path)
+    infer_cfg(args.parser_path, args.train_path, args.log_path, store_path=args.store,
+              server=args.server, native=args.native, concurrency=args.concurrency,
+              record_path=args.record, replay_path=args.replay, simulate_latency=args.simulate_latency,
+              channel=args.channel)
     showStatistics()
     stop()
\ No newline at end of file
@@ -12,9 +12,10 @@ from crucio.lexical.infer.lexical_infer import segment_examples, get_token_oracl
 from crucio.lexical.infer.segment.split import LexicalGroup, PreSegmenter
 from crucio.inference.build_dm import build_dm
 from crucio.tokenize import Tokens, TokenizedContext, Token
+from crucio.tokenize.span import reset_examples
 from crucio.utils import prettyTokens, str1
 from crucio.utils.object_manage import ObjectManager
-from crucio.utils.statistics import RecordTime, counting
+from crucio.utils.statistics import RecordTime, counting, phase
 from crucio.lexical.classifier.DecisionNode import LexicalRule, is_multi_token
 from crucio.decompose.decompose_forest import DeForest
 from crucio.decompose.decompose_forest.grammar_infer import de_func, DeForestTeacher
@@ -147,7 +148,8 @@ class GrammarLearner(Learner):
         logger.print(str1(self.__examples[-1]))
         logger.print(prettyTokens(example))
         start = self.__oracle.raw().calls
-        self.__dm.addExample(self.__examples[-1])
+        with phase('DM build'):
+            self.__dm.addExample(self.__examples[-1])
         counting('distributional matrix construct calls', self.__oracle.raw().calls - start)
         with RecordTime('grammar infer'):
             self.__grammar = infer_dm(self.__examples, self.__dm)
@@ -199,6 +201,8 @@ class GrammarLearner(Learner):
 
 
 def run_crucio3(oracle, examples):
+    # spans of this run are interned into a fresh table
+    reset_examples()
     # lexical inference
     segs, insensitive_chars = segment_examples(examples, oracle)
     defaultGroup = LexicalGroup.fromSegs(segs, insensitive_chars)
@@ -1,9 +1,15 @@
+import os
+
 import numpy as np
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 
+# CRUCIO_OPENMP=1 python setup.py build_ext --inplace builds the adjacency kernel with OpenMP
+openmp = ['-fopenmp'] if os.environ.get('CRUCIO_OPENMP') else []
+
 setup(
     name="compute_T_c_extension",
-    ext_modules=cythonize("compute_T.pyx"),
+    ext_modules=cythonize([Extension("compute_T", ["compute_T.pyx"],
+                                     extra_compile_args=openmp, extra_link_args=openmp)]),
     include_dirs=[np.get_include()]
-)
\ No newline at end of file
+)